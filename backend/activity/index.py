@@ -5,40 +5,81 @@ Args: event - dict with httpMethod, headers (X-Auth-Token)
 Returns: HTTP response with activity log entries
 '''
 
+import base64
 import json
 import os
-import hashlib
-import hmac
-import psycopg2
-import psycopg2.extras
-from typing import Dict, Any, Optional
-from datetime import datetime
+from db import acquire_read_connection, release_connection
+import prepared
+import tracing
+from auth_tokens import verify_token
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
 
-def verify_token(token: str) -> Optional[Dict[str, Any]]:
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(created_at: datetime, activity_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), activity_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token: str) -> Optional[tuple]:
     try:
-        secret = os.environ.get('JWT_SECRET', 'default-secret-key')
-        parts = token.split(':')
-        if len(parts) != 5:
-            return None
-        
-        user_id, email, role, expiry, signature = parts
-        payload = f"{user_id}:{email}:{role}:{expiry}"
-        expected_signature = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
-        
-        if not hmac.compare_digest(signature, expected_signature):
-            return None
-        
-        if datetime.fromisoformat(expiry) < datetime.utcnow():
-            return None
-        
-        return {
-            'user_id': int(user_id),
-            'email': email,
-            'role': role
-        }
-    except:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, activity_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(activity_id)
+    except (ValueError, TypeError):
         return None
 
+def build_activity_filters(params: Dict[str, Any], user_data: Dict[str, Any]) -> tuple:
+    '''Returns (conditions, args, (status, message) or None); admins may pass region= to read a whole region'''
+    conditions: List[str] = []
+    args: List[Any] = []
+    
+    region = params.get('region', '').strip()
+    if region:
+        if user_data['role'] != 'admin':
+            return None, None, (403, 'Only administrators can view regional activity')
+        conditions.append("al.user_id IN (SELECT id FROM t_p91929212_notary_registry_syst.users WHERE region = %s)")
+        args.append(region)
+    else:
+        conditions.append("al.user_id = %s")
+        args.append(user_data['user_id'])
+    
+    action_type = params.get('action_type', '').strip()
+    if action_type:
+        conditions.append("al.action_type = %s")
+        args.append(action_type)
+    
+    try:
+        date_from = params.get('from', '').strip()
+        if date_from:
+            conditions.append("al.created_at >= %s")
+            args.append(datetime.fromisoformat(date_from))
+        
+        date_to = params.get('to', '').strip()
+        if date_to:
+            upper = datetime.fromisoformat(date_to)
+            if len(date_to) == 10:
+                upper += timedelta(days=1)
+                conditions.append("al.created_at < %s")
+            else:
+                conditions.append("al.created_at <= %s")
+            args.append(upper)
+    except ValueError:
+        return None, None, (400, 'from and to must be ISO dates')
+    
+    before = params.get('before', '').strip()
+    if before:
+        position = decode_cursor(before)
+        if not position:
+            return None, None, (400, 'Invalid page cursor')
+        # The plain bound lets the planner prune the partitions of later years
+        conditions.append("(al.created_at, al.id) < (%s, %s) AND al.created_at <= %s")
+        args.extend(position + (position[0],))
+    
+    return conditions, args, None
+
+@tracing.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -48,7 +89,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Primary-Until',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -80,6 +121,29 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Invalid or expired token'})
         }
     
+    params = event.get('queryStringParameters', {}) or {}
+    
+    try:
+        limit = int(params.get('limit') or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        limit = 0
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return {
+            'statusCode': 400,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'})
+        }
+    
+    conditions, args, error = build_activity_filters(params, user_data)
+    if error:
+        return {
+            'statusCode': error[0],
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': error[1]})
+        }
+    
     dsn = os.environ.get('DATABASE_URL')
     if not dsn:
         return {
@@ -91,35 +155,47 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     conn = None
     try:
-        conn = psycopg2.connect(dsn)
+        conn = acquire_read_connection(dsn, (event.get('headers') or {}).get('X-Primary-Until'))
         cur = conn.cursor()
         
-        cur.execute("""
-            SELECT al.id, al.action_type, al.action_description, al.created_at, d.document_number
-            FROM t_p91929212_notary_registry_syst.activity_log al
+        # ?archive=1 reads the closed years moved to activity_log_archive; either feed may
+        # point at documents whose year has been archived
+        table = 'activity_log_archive' if params.get('archive', '') in ('1', 'true') else 'activity_log'
+        prepared.execute(cur, f"""
+            SELECT al.id, al.action_type, al.action_description, al.created_at,
+                   COALESCE(d.document_number, da.document_number), al.user_id
+            FROM t_p91929212_notary_registry_syst.{table} al
             LEFT JOIN t_p91929212_notary_registry_syst.documents d ON al.document_id = d.id
-            WHERE al.user_id = %s
-            ORDER BY al.created_at DESC
-            LIMIT 50
-        """, (user_data['user_id'],))
+            LEFT JOIN t_p91929212_notary_registry_syst.documents_archive da ON d.id IS NULL AND al.document_id = da.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY al.created_at DESC, al.id DESC
+            LIMIT %s
+        """, args + [limit + 1])
         
         rows = cur.fetchall()
         
-        activities = []
-        for row in rows:
-            activities.append({
-                'id': row[0],
-                'action_type': row[1],
-                'description': row[2],
-                'created_at': row[3].isoformat() if row[3] else None,
-                'document_number': row[4]
-            })
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+        
+        with tracing.span('serialize'):
+            activities = []
+            for row in rows:
+                activities.append({
+                    'id': row[0],
+                    'action_type': row[1],
+                    'description': row[2],
+                    'created_at': row[3].isoformat() if row[3] else None,
+                    'document_number': row[4],
+                    'user_id': row[5]
+                })
         
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'activities': activities})
+            'body': json.dumps({'activities': activities, 'next_cursor': next_cursor})
         }
     except Exception as e:
         return {
@@ -130,4 +206,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            release_connection(conn)
\ No newline at end of file
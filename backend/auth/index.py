@@ -7,48 +7,15 @@ Returns: HTTP response with JWT token or user info
 
 import json
 import os
-import hashlib
-import hmac
-import psycopg2
-import psycopg2.extras
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
-
-def generate_token(user_id: int, email: str, role: str) -> str:
-    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
-    expiry = (datetime.utcnow() + timedelta(days=7)).isoformat()
-    payload = f"{user_id}:{email}:{role}:{expiry}"
-    signature = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
-    return f"{payload}:{signature}"
-
-def verify_token(token: str) -> Optional[Dict[str, Any]]:
-    try:
-        secret = os.environ.get('JWT_SECRET', 'default-secret-key')
-        parts = token.split(':')
-        if len(parts) != 5:
-            return None
-        
-        user_id, email, role, expiry, signature = parts
-        payload = f"{user_id}:{email}:{role}:{expiry}"
-        expected_signature = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
-        
-        if not hmac.compare_digest(signature, expected_signature):
-            return None
-        
-        if datetime.fromisoformat(expiry) < datetime.utcnow():
-            return None
-        
-        return {
-            'user_id': int(user_id),
-            'email': email,
-            'role': role
-        }
-    except:
-        return None
-
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+from db import acquire_connection, acquire_read_connection, is_replica, release_connection
+import prepared
+import tracing
+from auth_tokens import generate_token, verify_token
+import activity_log
+import passwords
+from typing import Dict, Any
 
+@tracing.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -58,7 +25,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Primary-Until',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -75,7 +42,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     conn = None
     try:
-        conn = psycopg2.connect(dsn)
+        if method == 'GET':
+            conn = acquire_read_connection(dsn, (event.get('headers') or {}).get('X-Primary-Until'))
+        else:
+            conn = acquire_connection(dsn)
         cur = conn.cursor()
         
         if method == 'POST':
@@ -91,14 +61,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Email and password required'})
                 }
             
-            password_hash = hash_password(password)
+            if not passwords.allow_login_attempt(email):
+                return {
+                    'statusCode': 429,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', 'Retry-After': '60'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'Too many login attempts, try again later'})
+                }
             
-            cur.execute(
-                "SELECT id, email, full_name, role, phone, region FROM t_p91929212_notary_registry_syst.users WHERE email = %s AND password_hash = %s",
-                (email, password_hash)
+            prepared.execute(
+                cur,
+                "SELECT id, email, full_name, role, phone, region, password_hash FROM t_p91929212_notary_registry_syst.users WHERE email = %s",
+                (email,)
             )
             user = cur.fetchone()
             
+            if user:
+                if not passwords.verify_password(password, user[6]):
+                    user = None
+                elif passwords.needs_rehash(user[6]):
+                    cur.execute(
+                        "UPDATE t_p91929212_notary_registry_syst.users SET password_hash = %s WHERE id = %s",
+                        (passwords.hash_password(password), user[0])
+                    )
+                    conn.commit()
+            else:
+                passwords.burn_hash_time(password)
+            
             if not user:
                 return {
                     'statusCode': 401,
@@ -107,14 +96,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Invalid credentials'})
                 }
             
-            user_id, user_email, full_name, role, phone, region = user
+            user_id, user_email, full_name, role, phone, region, _ = user
             token = generate_token(user_id, user_email, role)
             
-            cur.execute(
-                "INSERT INTO t_p91929212_notary_registry_syst.activity_log (user_id, action_type, action_description) VALUES (%s, %s, %s)",
-                (user_id, 'login', f'User {full_name} logged in')
-            )
-            conn.commit()
+            activity_log.record(user_id, 'login', f'User {full_name} logged in')
             
             return {
                 'statusCode': 200,
@@ -152,7 +137,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Invalid or expired token'})
                 }
             
-            cur.execute(
+            prepared.execute(
+                cur,
                 "SELECT id, email, full_name, role, phone, region FROM t_p91929212_notary_registry_syst.users WHERE id = %s",
                 (user_data['user_id'],)
             )
@@ -168,6 +154,22 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             user_id, user_email, full_name, role, phone, region = user
             
+            if (event.get('queryStringParameters') or {}).get('stats') == 'runtime':
+                if role != 'admin':
+                    return {
+                        'statusCode': 403,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Only admins can read runtime statistics'})
+                    }
+                # Login events are queued by this process; its queue and flush counters since start
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'activity_log': activity_log.metrics()})
+                }
+            
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -199,4 +201,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            if not is_replica(conn):
+                activity_log.flush_pending(conn)
+            release_connection(conn)
\ No newline at end of file
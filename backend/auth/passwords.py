@@ -0,0 +1,102 @@
+'''
+Salted scrypt password hashes with transparent upgrade of legacy unsalted SHA-256 hashes
+Config: PASSWORD_SCRYPT_N / PASSWORD_SCRYPT_R / PASSWORD_SCRYPT_P - cost parameters
+        (pick them with benchmarks/password_hashing.py)
+        PASSWORD_HASH_WORKERS - threads that run hash verification (default 2)
+        LOGIN_ATTEMPTS_PER_MINUTE - attempts allowed per email (default 10)
+'''
+
+import base64
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', '16384'))
+SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', '8'))
+SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', '1'))
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+LOGIN_ATTEMPTS_PER_MINUTE = float(os.environ.get('LOGIN_ATTEMPTS_PER_MINUTE', '10'))
+RATE_LIMIT_TRACKED_EMAILS = 10000
+
+LEGACY_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+_executor = None
+_executor_lock = threading.Lock()
+_buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+_buckets_lock = threading.Lock()
+_dummy_hash = ''
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p + (1 << 20), dklen=32)
+
+
+def hash_password(password: str, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P) -> str:
+    salt = secrets.token_bytes(16)
+    return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+
+def _get_executor():
+    # Created on the first login, so GET /me cold starts skip concurrent.futures
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            import concurrent.futures
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='password-hash')
+        return _executor
+
+
+def _verify(password: str, stored_hash: str) -> bool:
+    if LEGACY_SHA256.match(stored_hash):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+    try:
+        scheme, n, r, p, salt, expected = stored_hash.split('$')
+        if scheme != 'scrypt':
+            return False
+        derived = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+        return hmac.compare_digest(derived, base64.b64decode(expected))
+    except ValueError:
+        return False
+
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    '''Runs the KDF on the hashing pool so the calling thread stays free'''
+    return _get_executor().submit(_verify, password, stored_hash).result(timeout=HASH_TIMEOUT)
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    return stored_hash.split('$')[:4] != ['scrypt', str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+
+def burn_hash_time(password: str) -> None:
+    '''Spend the same work as a real check so unknown emails are not revealed by timing'''
+    global _dummy_hash
+    if not _dummy_hash:
+        _dummy_hash = hash_password(secrets.token_hex(8))
+    verify_password(password, _dummy_hash)
+
+
+def allow_login_attempt(email: str) -> bool:
+    '''Per-email token bucket, refilled at LOGIN_ATTEMPTS_PER_MINUTE'''
+    key = email.lower()
+    now = time.monotonic()
+    rate = LOGIN_ATTEMPTS_PER_MINUTE / 60
+    with _buckets_lock:
+        tokens, updated_at = _buckets.pop(key, (LOGIN_ATTEMPTS_PER_MINUTE, now))
+        tokens = min(LOGIN_ATTEMPTS_PER_MINUTE, tokens + (now - updated_at) * rate)
+        allowed = tokens >= 1
+        _buckets[key] = (tokens - 1 if allowed else tokens, now)
+        while len(_buckets) > RATE_LIMIT_TRACKED_EMAILS:
+            _buckets.popitem(last=False)
+    return allowed
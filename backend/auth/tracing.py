@@ -0,0 +1,183 @@
+'''
+Per-request timing spans, slow-query logging and the Server-Timing header
+Config: TRACING - 'on' to enable (default off; disabled tracing leaves handlers and cursors untouched)
+        TRACING_SLOW_QUERY_MS - statements slower than this are logged with their EXPLAIN plan (default 200)
+
+Slow-query log lines never carry data: parameters are not logged, literals in the
+statement text (execute_values and mogrify send statements with the values already
+substituted) are replaced with ? before the text is truncated to SLOW_QUERY_TEXT_LIMIT,
+and string constants in the EXPLAIN plan are replaced the same way
+'''
+
+import functools
+import json
+import os
+import re
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+TRACING_ENABLED = os.environ.get('TRACING', 'off').lower() in ('1', 'on', 'true')
+SLOW_QUERY_MS = float(os.environ.get('TRACING_SLOW_QUERY_MS', '200'))
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'with', 'execute')
+SLOW_QUERY_TEXT_LIMIT = 1000
+STRING = r"(?:\b[EeXxBb])?'(?:[^']|'')*'"
+LITERAL = re.compile(STRING + r"|(?<![\w$])\d+(?:\.\d+)?\b")
+VALUES_ROW = r"\((?:[?\s,]|::\w+|\bNULL\b|\bDEFAULT\b|\bTRUE\b|\bFALSE\b)*\)"
+ROW_LIST = re.compile(VALUES_ROW + r"(?:\s*,\s*" + VALUES_ROW + r")+", re.IGNORECASE)
+
+
+def logger():
+    # logging is imported lazily, it is needed only once tracing or slow-query logging fires
+    import logging
+    return logging.getLogger('tracing')
+
+
+_current: ContextVar[Optional['Trace']] = ContextVar('trace', default=None)
+_noop = nullcontext()
+
+
+class Trace:
+    def __init__(self, request_id: Optional[str], function_name: Optional[str]):
+        self.request_id = request_id
+        self.function_name = function_name
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+    
+    def add(self, name: str, elapsed_ms: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + elapsed_ms
+        self.counts[name] = self.counts.get(name, 0) + 1
+    
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - started) * 1000)
+    
+    def server_timing(self) -> str:
+        return ', '.join(f'{name};dur={elapsed:.1f}' for name, elapsed in self.durations.items())
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'request_id': self.request_id,
+            'function_name': self.function_name,
+            'spans_ms': {name: round(elapsed, 2) for name, elapsed in self.durations.items()},
+            'counts': self.counts
+        }
+
+
+def span(name: str):
+    '''Time a block against the current request; a shared no-op when tracing is off'''
+    trace = _current.get()
+    if trace is None:
+        return _noop
+    return trace.span(name)
+
+
+def redact(text: str) -> str:
+    '''Statement shape only: literals become ?, multi-row VALUES lists collapse to their first row'''
+    text = ROW_LIST.sub(lambda match: match.group(0)[:match.group(0).index(')') + 1] + ', ...', LITERAL.sub('?', text))
+    text = ' '.join(text.split())
+    return text if len(text) <= SLOW_QUERY_TEXT_LIMIT else text[:SLOW_QUERY_TEXT_LIMIT] + '...'
+
+
+def _explain(cursor: psycopg2.extensions.cursor, text: str, params: Any) -> str:
+    # Inside a transaction a failed EXPLAIN would abort the request's own work, so it runs
+    # under a savepoint; with autocommit there is no transaction to protect
+    conn = cursor.connection
+    guarded = not conn.autocommit
+    with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as explain:
+        if guarded:
+            explain.execute('SAVEPOINT slow_query_explain')
+        try:
+            explain.execute('EXPLAIN ' + text, params)
+            # Plans repeat constants in their conditions; costs and row counts stay readable
+            plan = re.sub(STRING, '?', '\n'.join(row[0] for row in explain.fetchall()))
+        except psycopg2.Error as e:
+            if guarded:
+                explain.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            return f'EXPLAIN failed: {e.pgcode or type(e).__name__}'
+        if guarded:
+            explain.execute('RELEASE SAVEPOINT slow_query_explain')
+        return plan
+
+
+def _log_slow_query(cursor: psycopg2.extensions.cursor, query: Any, params: Any, elapsed_ms: float, trace: Trace) -> None:
+    text = query.decode() if isinstance(query, bytes) else str(query)
+    plan = None
+    if cursor.name is None and text.lstrip().lower().startswith(EXPLAINABLE):
+        try:
+            plan = _explain(cursor, text, params)
+        except psycopg2.Error as e:
+            plan = f'EXPLAIN failed: {e.pgcode or type(e).__name__}'
+    logger().warning(json.dumps({
+        'slow_query_ms': round(elapsed_ms, 2),
+        'request_id': trace.request_id,
+        'function_name': trace.function_name,
+        'query': redact(text),
+        'plan': plan
+    }, ensure_ascii=False))
+
+
+class TracingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        trace = _current.get()
+        if trace is None:
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        result = super().execute(query, vars)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        trace.add('query', elapsed_ms)
+        if elapsed_ms >= SLOW_QUERY_MS:
+            _log_slow_query(self, query, vars, elapsed_ms, trace)
+        return result
+    
+    def _timed_fetch(self, fetch: Callable, *args):
+        trace = _current.get()
+        if trace is None:
+            return fetch(*args)
+        with trace.span('fetch'):
+            return fetch(*args)
+    
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+    
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+    
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+def instrument_connection(conn: psycopg2.extensions.connection) -> None:
+    if TRACING_ENABLED:
+        conn.cursor_factory = TracingCursor
+
+
+def traced(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    '''Collect spans for one invocation and report them as Server-Timing and a structured log line'''
+    if not TRACING_ENABLED:
+        return handler
+    
+    @functools.wraps(handler)
+    def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+        trace = Trace(getattr(context, 'request_id', None), getattr(context, 'function_name', None))
+        token = _current.set(trace)
+        try:
+            with trace.span('total'):
+                response = handler(event, context)
+        finally:
+            _current.reset(token)
+        headers = response.setdefault('headers', {})
+        headers['Server-Timing'] = trace.server_timing()
+        headers['Timing-Allow-Origin'] = '*'
+        logger().info(json.dumps(trace.summary()))
+        return response
+    
+    return wrapper
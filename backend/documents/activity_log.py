@@ -0,0 +1,166 @@
+'''
+Activity log writer: events are buffered in process and written in multi-row batches
+Config: ACTIVITY_LOG_BATCH_SIZE - events per INSERT (default 100)
+        ACTIVITY_LOG_FLUSH_INTERVAL - seconds between background flushes (default 1)
+        ACTIVITY_LOG_MAX_QUEUE - events kept while the database is unreachable (default 10000)
+Cloud functions flush at the end of every invocation, before the container can be frozen;
+long-lived processes call start_background_flusher() instead.
+Audit records that must commit together with the change they describe go through write_now().
+'''
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+ACTIVITY_LOG_BATCH_SIZE = int(os.environ.get('ACTIVITY_LOG_BATCH_SIZE', '100'))
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_LOG_FLUSH_INTERVAL', '1'))
+ACTIVITY_LOG_MAX_QUEUE = int(os.environ.get('ACTIVITY_LOG_MAX_QUEUE', '10000'))
+
+INSERT_ACTIVITY = (
+    "INSERT INTO t_p91929212_notary_registry_syst.activity_log "
+    "(user_id, action_type, action_description, document_id) VALUES %s"
+)
+
+
+def logger():
+    # logging is imported lazily, it is needed only when a flush fails or debug output is on
+    import logging
+    return logging.getLogger('activity_log')
+
+
+_queue: List[Tuple[int, str, str, Optional[int]]] = []
+_queue_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wakeup = threading.Event()
+_stop = threading.Event()
+_flusher: Optional[threading.Thread] = None
+_metrics: Dict[str, float] = {
+    'enqueued': 0,
+    'flushed': 0,
+    'dropped': 0,
+    'flushes': 0,
+    'failed_flushes': 0,
+    'last_flush_ms': 0.0,
+    'max_flush_ms': 0.0
+}
+
+
+def record(user_id: int, action_type: str, description: str, document_id: Optional[int] = None) -> None:
+    '''Queue an event for the next batched flush'''
+    with _queue_lock:
+        if len(_queue) >= ACTIVITY_LOG_MAX_QUEUE:
+            _queue.pop(0)
+            _metrics['dropped'] += 1
+        _queue.append((user_id, action_type, description, document_id))
+        _metrics['enqueued'] += 1
+        if len(_queue) >= ACTIVITY_LOG_BATCH_SIZE:
+            _wakeup.set()
+
+
+def write_now(cur, rows: List[Tuple[int, str, str, Optional[int]]]) -> None:
+    '''Write events inside the caller's transaction, so they commit or roll back with it'''
+    import psycopg2.extras
+    psycopg2.extras.execute_values(cur, INSERT_ACTIVITY, rows, page_size=max(len(rows), 1))
+
+
+def flush(conn: psycopg2.extensions.connection) -> int:
+    '''Write every queued event on the given connection; returns the number written'''
+    with _flush_lock:
+        with _queue_lock:
+            pending = _queue[:]
+            del _queue[:]
+        if not pending:
+            return 0
+        
+        started = time.perf_counter()
+        try:
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            with conn.cursor() as cur:
+                for offset in range(0, len(pending), ACTIVITY_LOG_BATCH_SIZE):
+                    write_now(cur, pending[offset:offset + ACTIVITY_LOG_BATCH_SIZE])
+            conn.commit()
+        except psycopg2.Error:
+            _metrics['failed_flushes'] += 1
+            with _queue_lock:
+                _queue[:0] = pending[-ACTIVITY_LOG_MAX_QUEUE:]
+            logger().exception('activity log flush failed, %d events requeued', len(pending))
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+            return 0
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _metrics['flushes'] += 1
+        _metrics['flushed'] += len(pending)
+        _metrics['last_flush_ms'] = elapsed_ms
+        _metrics['max_flush_ms'] = max(_metrics['max_flush_ms'], elapsed_ms)
+        logger().debug('flushed %d activity events in %.1f ms, queue depth %d', len(pending), elapsed_ms, pending_count())
+        return len(pending)
+
+
+def flush_pending(conn: psycopg2.extensions.connection) -> int:
+    '''End-of-invocation flush; a no-op when a background flusher owns the queue'''
+    if _flusher is not None and _flusher.is_alive():
+        return 0
+    return flush(conn)
+
+
+def pending_count() -> int:
+    with _queue_lock:
+        return len(_queue)
+
+
+def metrics() -> Dict[str, float]:
+    with _queue_lock:
+        snapshot = dict(_metrics)
+        snapshot['queue_depth'] = len(_queue)
+    return snapshot
+
+
+def start_background_flusher(acquire: Callable[[], Any], release: Callable[[Any], None]) -> None:
+    '''Flush by size or every ACTIVITY_LOG_FLUSH_INTERVAL seconds from a daemon thread'''
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    _stop.clear()
+    
+    def run() -> None:
+        while not _stop.is_set():
+            _wakeup.wait(ACTIVITY_LOG_FLUSH_INTERVAL)
+            _wakeup.clear()
+            if not pending_count():
+                continue
+            try:
+                conn = acquire()
+            except psycopg2.Error:
+                logger().exception('activity log flusher could not get a connection')
+                continue
+            try:
+                flush(conn)
+            finally:
+                release(conn)
+    
+    _flusher = threading.Thread(target=run, name='activity-log-flusher', daemon=True)
+    _flusher.start()
+
+
+def stop_background_flusher(acquire: Callable[[], Any], release: Callable[[Any], None]) -> None:
+    '''Stop the flusher thread and write whatever is still queued'''
+    global _flusher
+    _stop.set()
+    _wakeup.set()
+    if _flusher is not None:
+        _flusher.join()
+        _flusher = None
+    if pending_count():
+        conn = acquire()
+        try:
+            flush(conn)
+        finally:
+            release(conn)
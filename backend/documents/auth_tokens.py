@@ -0,0 +1,100 @@
+'''
+Signed session tokens shared by the cloud function handlers
+Config: JWT_SECRET - current signing key
+        JWT_PREVIOUS_SECRETS - comma-separated keys still accepted for verification during rotation
+        TOKEN_CACHE_SIZE - verified tokens kept per process (default 1024)
+'''
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '1024'))
+
+_keys: List[Tuple[str, bytes]] = []
+_cache: 'OrderedDict[str, Tuple[float, str, Dict[str, Any]]]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _fingerprint(key: bytes) -> str:
+    return hashlib.sha256(key).hexdigest()[:16]
+
+
+def load_keys() -> None:
+    '''(Re)read signing keys; cached tokens stay valid as long as the key that verified them is still accepted'''
+    global _keys
+    secrets = [os.environ.get('JWT_SECRET', 'default-secret-key')]
+    secrets += [secret.strip() for secret in os.environ.get('JWT_PREVIOUS_SECRETS', '').split(',') if secret.strip()]
+    keys = [(_fingerprint(secret.encode()), secret.encode()) for secret in secrets]
+    accepted = {fingerprint for fingerprint, _ in keys}
+    with _cache_lock:
+        _keys = keys
+        for token in [token for token, entry in _cache.items() if entry[1] not in accepted]:
+            del _cache[token]
+
+
+def _sign(key: bytes, payload: str) -> str:
+    return hmac.new(key, payload.encode(), hashlib.sha256).hexdigest()
+
+
+def generate_token(user_id: int, email: str, role: str) -> str:
+    expiry = (datetime.utcnow() + timedelta(days=7)).isoformat()
+    payload = f"{user_id}:{email}:{role}:{expiry}"
+    return f"{payload}:{_sign(_keys[0][1], payload)}"
+
+
+def verify_token(token: str) -> Optional[Dict[str, Any]]:
+    now = time.time()
+    with _cache_lock:
+        entry = _cache.get(token)
+        if entry is not None:
+            if entry[0] > now:
+                _cache.move_to_end(token)
+                return dict(entry[2])
+            del _cache[token]
+    
+    try:
+        payload, signature = token.rsplit(':', 1)
+        parts = payload.split(':', 3)
+        if len(parts) != 4:
+            return None
+        
+        user_id, email, role, expiry = parts
+        fingerprint = next(
+            (fingerprint for fingerprint, key in _keys if hmac.compare_digest(signature, _sign(key, payload))),
+            None
+        )
+        if fingerprint is None:
+            return None
+        
+        expires_at = datetime.fromisoformat(expiry).replace(tzinfo=timezone.utc).timestamp()
+        if expires_at < now:
+            return None
+        
+        user_data = {
+            'user_id': int(user_id),
+            'email': email,
+            'role': role
+        }
+    except (ValueError, TypeError):
+        return None
+    
+    with _cache_lock:
+        _cache[token] = (expires_at, fingerprint, user_data)
+        _cache.move_to_end(token)
+        while len(_cache) > TOKEN_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return dict(user_data)
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+load_keys()
@@ -0,0 +1,163 @@
+'''
+Read-through cache for registry listings
+Config: CACHE_BACKEND - 'memory' (default, per warm container), 'redis' or 'off'
+        CACHE_REDIS_URL - any Redis-compatible server when CACHE_BACKEND=redis
+        CACHE_TTL - seconds an entry may be served (default 30)
+        CACHE_MAX_ENTRIES - in-process entries kept (default 256)
+Entries record the versions of the tags they depend on; writes bump those versions,
+so invalidation is exact without scanning keys.
+
+With the memory backend a write only bumps the versions of the container that handled
+it, and other warm containers keep their entries until they expire. Their TTL is
+therefore capped at DB_READ_YOUR_WRITES_WINDOW: by the time a writer's reads leave the
+primary (and the cache) no container can still serve a page from before the write.
+Deployments that want longer-lived entries across several instances need redis.
+'''
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_TTL = float(os.environ.get('CACHE_TTL', '30'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '256'))
+MEMORY_CACHE_TTL = min(CACHE_TTL, float(os.environ.get('DB_READ_YOUR_WRITES_WINDOW', '10')))
+
+
+def logger():
+    # logging is imported lazily, it is needed only when the cache backend misbehaves
+    import logging
+    return logging.getLogger('cache')
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self.versions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+    
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def get_versions(self, tags: List[str]) -> List[int]:
+        with self.lock:
+            return [self.versions.get(tag, 0) for tag in tags]
+    
+    def bump_versions(self, tags: Iterable[str]) -> None:
+        with self.lock:
+            for tag in tags:
+                self.versions[tag] = self.versions.get(tag, 0) + 1
+
+
+class RedisBackend:
+    def __init__(self, url: str = CACHE_REDIS_URL):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+    
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get('registry:entry:' + key)
+        return json.loads(raw) if raw is not None else None
+    
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.client.set('registry:entry:' + key, json.dumps(value), px=int(ttl * 1000))
+    
+    def get_versions(self, tags: List[str]) -> List[int]:
+        return [int(version or 0) for version in self.client.mget(['registry:tag:' + tag for tag in tags])]
+    
+    def bump_versions(self, tags: Iterable[str]) -> None:
+        pipeline = self.client.pipeline(transaction=False)
+        for tag in tags:
+            pipeline.incr('registry:tag:' + tag)
+        pipeline.execute()
+
+
+class ResultCache:
+    def __init__(self, backend: Any, ttl: float = CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+    
+    @staticmethod
+    def make_key(params: Dict[str, Any]) -> str:
+        normalized = json.dumps(sorted(params.items()), ensure_ascii=False)
+        return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+    
+    def get(self, key: str, tags: List[str]) -> Optional[Any]:
+        try:
+            entry = self.backend.get(key)
+            if entry is not None and entry['versions'] == self.backend.get_versions(tags):
+                self.hits += 1
+                return entry['value']
+        except Exception:
+            self.errors += 1
+            logger().exception('cache read failed')
+        self.misses += 1
+        return None
+    
+    def set(self, key: str, tags: List[str], value: Any, versions: List[int], ttl: Optional[float] = None) -> None:
+        '''
+        versions must be read before the query ran, so a write racing the query leaves the entry
+        stale-on-arrival; ttl shortens the cache TTL for a value that was already behind when read
+        '''
+        try:
+            self.backend.set(key, {'versions': versions, 'value': value}, self.ttl if ttl is None else min(self.ttl, ttl))
+        except Exception:
+            self.errors += 1
+            logger().exception('cache write failed')
+    
+    def versions(self, tags: List[str]) -> List[int]:
+        try:
+            return self.backend.get_versions(tags)
+        except Exception:
+            self.errors += 1
+            return [-1] * len(tags)
+    
+    def invalidate(self, tags: Iterable[str]) -> None:
+        try:
+            self.backend.bump_versions(tags)
+        except Exception:
+            self.errors += 1
+            logger().exception('cache invalidation failed')
+    
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
+
+
+def create_cache() -> Optional[ResultCache]:
+    if CACHE_BACKEND == 'off':
+        return None
+    if CACHE_BACKEND == 'redis':
+        try:
+            return ResultCache(RedisBackend())
+        except ImportError:
+            logger().warning('redis package is not installed, falling back to the in-process cache')
+    return ResultCache(MemoryBackend(), ttl=MEMORY_CACHE_TTL)
@@ -0,0 +1,291 @@
+'''
+Connection pools kept at module level so warm containers reuse PostgreSQL sessions
+Config: DB_POOL_MAX_SIZE - max open connections per database and process (default 4)
+        DB_POOL_TIMEOUT - seconds to wait for a free connection (default 5)
+        DB_HEALTH_CHECK_INTERVAL - idle seconds before a connection is pinged (default 30)
+        DB_POOL_RESET - 'rollback' (default) or 'reset_all' to also RESET session settings
+        DB_PREWARM - 'on' to open the first connection in the background while the
+                     function is still importing (default off)
+        DATABASE_REPLICA_URLS - comma-separated read replicas for read-only requests (default none)
+        DB_REPLICA_MAX_LAG - seconds of replication lag before a replica is skipped (default 10)
+        DB_REPLICA_CHECK_INTERVAL - seconds between replication lag checks (default 5)
+        DB_REPLICA_RETRY_INTERVAL - seconds an unreachable replica is left out (default 30)
+        DB_REPLICA_ACQUIRE_TIMEOUT - seconds to wait for a free replica connection before
+                                     trying the next replica or the primary (default 0.05)
+        DB_READ_YOUR_WRITES_WINDOW - seconds a client reads from the primary after its own
+                                     write, see primary_until() (default 10)
+'''
+
+import itertools
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+import prepared
+import tracing
+
+POOL_MAX_SIZE = max(1, int(os.environ.get('DB_POOL_MAX_SIZE', '4')))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))
+HEALTH_CHECK_INTERVAL = float(os.environ.get('DB_HEALTH_CHECK_INTERVAL', '30'))
+POOL_RESET = os.environ.get('DB_POOL_RESET', 'rollback')
+PREWARM = os.environ.get('DB_PREWARM', 'off').lower() in ('1', 'on', 'true')
+REPLICA_DSNS = [dsn.strip() for dsn in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if dsn.strip()]
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', '10'))
+REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', '5'))
+REPLICA_RETRY_INTERVAL = float(os.environ.get('DB_REPLICA_RETRY_INTERVAL', '30'))
+REPLICA_ACQUIRE_TIMEOUT = float(os.environ.get('DB_REPLICA_ACQUIRE_TIMEOUT', '0.05'))
+READ_YOUR_WRITES_WINDOW = float(os.environ.get('DB_READ_YOUR_WRITES_WINDOW', '10'))
+
+# A replica that has replayed everything it received is current, however long ago the
+# last transaction on the primary was
+REPLICATION_LAG = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+_pools: Dict[str, psycopg2.pool.ThreadedConnectionPool] = {}
+_pool_lock = threading.Lock()
+_slots: Dict[str, threading.BoundedSemaphore] = {}
+_owners: Dict[int, str] = {}
+_last_used: Dict[int, float] = {}
+_prewarm_thread: Optional[threading.Thread] = None
+
+
+class _LazyPool(psycopg2.pool.ThreadedConnectionPool):
+    '''
+    Opens connections on demand but keeps up to maxconn of them for reuse: psycopg2
+    closes every returned connection beyond minconn, and a non-zero minconn would
+    connect eagerly on a cold start
+    '''
+    def __init__(self, maxconn: int, dsn: str):
+        super().__init__(0, maxconn, dsn)
+        self.minconn = maxconn
+
+
+class _Replica:
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.lag = 0.0
+        self.checked_at: Optional[float] = None
+        self.unavailable_until = 0.0
+
+
+_replicas: List[_Replica] = [_Replica(dsn) for dsn in REPLICA_DSNS]
+_replicas_by_dsn: Dict[str, _Replica] = {replica.dsn: replica for replica in _replicas}
+_next_replica = itertools.count()
+
+
+def _get_pool(dsn: str) -> psycopg2.pool.ThreadedConnectionPool:
+    with _pool_lock:
+        pool = _pools.get(dsn)
+        if pool is None:
+            pool = _pools[dsn] = _LazyPool(POOL_MAX_SIZE, dsn)
+        return pool
+
+
+def _get_slots(dsn: str) -> threading.BoundedSemaphore:
+    with _pool_lock:
+        return _slots.setdefault(dsn, threading.BoundedSemaphore(POOL_MAX_SIZE))
+
+
+def _is_healthy(conn: psycopg2.extensions.connection) -> bool:
+    if conn.closed:
+        return False
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < HEALTH_CHECK_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def reset_session(conn: psycopg2.extensions.connection) -> None:
+    '''Return a connection to a clean state before handing it to the next request'''
+    if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    if conn.autocommit:
+        conn.autocommit = False
+    if POOL_RESET == 'reset_all':
+        with conn.cursor() as cur:
+            cur.execute('RESET ALL')
+        conn.commit()
+
+
+def acquire_connection(dsn: str, timeout: float = POOL_TIMEOUT) -> psycopg2.extensions.connection:
+    '''Take a healthy connection from the pool, reconnecting if the pooled one is broken'''
+    with tracing.span('connect'):
+        prewarming = _prewarm_thread
+        if prewarming is not None and prewarming is not threading.current_thread():
+            prewarming.join(POOL_TIMEOUT)
+        slots = _get_slots(dsn)
+        if not slots.acquire(timeout=timeout):
+            raise psycopg2.pool.PoolError('Connection pool exhausted')
+        try:
+            pool = _get_pool(dsn)
+            conn = pool.getconn()
+            if not _is_healthy(conn):
+                pool.putconn(conn, close=True)
+                _last_used.pop(id(conn), None)
+                prepared.forget(conn)
+                conn = pool.getconn()
+            _owners[id(conn)] = dsn
+            tracing.instrument_connection(conn)
+            return conn
+        except Exception:
+            slots.release()
+            raise
+
+
+def primary_until() -> str:
+    '''
+    Value for the X-Primary-Until response header after a write: clients echo it back on
+    their reads, which stay on the primary until then and so see the write at once
+    '''
+    return f'{time.time() + READ_YOUR_WRITES_WINDOW:.3f}'
+
+
+def reads_from_primary(until: Optional[str]) -> bool:
+    '''
+    True while an echoed X-Primary-Until is current; values further ahead than the window
+    (plus a second for clock differences between instances) are ignored
+    '''
+    try:
+        deadline = float(until or 0)
+    except ValueError:
+        return False
+    now = time.time()
+    return now < deadline <= now + READ_YOUR_WRITES_WINDOW + 1
+
+
+def _replication_lag(conn: psycopg2.extensions.connection) -> float:
+    with conn.cursor() as cur:
+        cur.execute(REPLICATION_LAG)
+        lag = float(cur.fetchone()[0])
+    conn.rollback()
+    return lag
+
+
+def acquire_read_connection(dsn: str, primary_until: Optional[str] = None) -> psycopg2.extensions.connection:
+    '''
+    Connection for a read-only request: the next replica in round-robin order that is
+    reachable and within DB_REPLICA_MAX_LAG, or the primary when none is, when no replicas
+    are configured or while the client is inside its read-your-writes window. A replica
+    whose pool is full is only waited on for DB_REPLICA_ACQUIRE_TIMEOUT, since the primary
+    can serve the read instead
+    '''
+    if not _replicas or reads_from_primary(primary_until):
+        return acquire_connection(dsn)
+    
+    start = next(_next_replica)
+    for offset in range(len(_replicas)):
+        replica = _replicas[(start + offset) % len(_replicas)]
+        now = time.monotonic()
+        checked = replica.checked_at is not None and now - replica.checked_at < REPLICA_CHECK_INTERVAL
+        if replica.unavailable_until > now or (checked and replica.lag > REPLICA_MAX_LAG):
+            continue
+        try:
+            conn = acquire_connection(replica.dsn, REPLICA_ACQUIRE_TIMEOUT)
+        except psycopg2.pool.PoolError:
+            continue
+        except psycopg2.Error:
+            replica.unavailable_until = now + REPLICA_RETRY_INTERVAL
+            continue
+        
+        if not checked:
+            try:
+                replica.lag = _replication_lag(conn)
+                replica.checked_at = now
+            except psycopg2.Error:
+                release_connection(conn)
+                replica.unavailable_until = now + REPLICA_RETRY_INTERVAL
+                continue
+        if replica.lag <= REPLICA_MAX_LAG:
+            return conn
+        release_connection(conn)
+    
+    return acquire_connection(dsn)
+
+
+def is_replica(conn: psycopg2.extensions.connection) -> bool:
+    return _owners.get(id(conn)) in REPLICA_DSNS
+
+
+def replica_headroom(conn: psycopg2.extensions.connection) -> Optional[float]:
+    '''
+    Seconds a result read on a replica connection can be reused before it may be older than
+    DB_REPLICA_MAX_LAG, counting the lag last measured and the time since, in which replay
+    may have stalled; None for a primary connection, whose results are current
+    '''
+    replica = _replicas_by_dsn.get(_owners.get(id(conn)) or '')
+    if replica is None:
+        return None
+    if replica.checked_at is None:
+        return 0.0
+    return max(0.0, REPLICA_MAX_LAG - replica.lag - (time.monotonic() - replica.checked_at))
+
+
+def release_connection(conn: psycopg2.extensions.connection) -> None:
+    '''Give a connection back to the pool, discarding it if it can no longer be reused'''
+    dsn = _owners.get(id(conn))
+    try:
+        pool = _pools.get(dsn) if dsn else None
+        if pool is None:
+            _owners.pop(id(conn), None)
+            conn.close()
+            return
+        broken = bool(conn.closed)
+        if not broken:
+            try:
+                reset_session(conn)
+            except psycopg2.Error:
+                broken = True
+        if broken:
+            _last_used.pop(id(conn), None)
+            _owners.pop(id(conn), None)
+            prepared.forget(conn)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+        try:
+            pool.putconn(conn, close=broken)
+        except psycopg2.pool.PoolError:
+            conn.close()
+    finally:
+        if dsn:
+            _get_slots(dsn).release()
+
+
+def prewarm(dsn: str) -> threading.Thread:
+    '''Open one pooled connection in a background thread, overlapping the handshake with imports'''
+    def run() -> None:
+        try:
+            release_connection(acquire_connection(dsn))
+        except psycopg2.Error:
+            pass  # the first request reconnects and reports the failure itself
+    
+    thread = threading.Thread(target=run, name='db-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+
+def close_pool() -> None:
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+        _last_used.clear()
+        prepared.forget_all()
+
+
+if PREWARM and os.environ.get('DATABASE_URL'):
+    _prewarm_thread = prewarm(os.environ['DATABASE_URL'])
@@ -0,0 +1,98 @@
+'''
+Chunked registry export: rows come from a named server-side cursor and are encoded
+as CSV or NDJSON one chunk at a time, optionally through an incremental gzip stream.
+A response carries at most EXPORT_PAGE_SIZE rows and the caller resumes from the last
+one, so memory stays bounded however large the registry is; the pages concatenate into
+one file (the CSV header is only on the first page, gzip pages are gzip members)
+Config: EXPORT_PAGE_SIZE - rows per export response (default 10000)
+'''
+
+import csv
+import io
+import json
+import os
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_PAGE_SIZE = int(os.environ.get('EXPORT_PAGE_SIZE', '10000'))
+
+EXPORT_COLUMNS = [
+    'id', 'number', 'type', 'date', 'registration_date', 'status', 'party1_name', 'party1_passport',
+    'party2_name', 'party2_passport', 'subject', 'notes', 'created_by_name'
+]
+
+
+def iter_rows(conn, query: str, args: List[Any], chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    cur = conn.cursor(name='registry_export')
+    cur.itersize = chunk_size
+    try:
+        cur.execute(query, args)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cur.close()
+
+
+def encode_csv(chunks: Iterator[List[Dict[str, Any]]], header: bool = True) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    if header:
+        writer.writeheader()
+    for documents in chunks:
+        writer.writerows(documents)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def encode_ndjson(chunks: Iterator[List[Dict[str, Any]]], header: bool = True) -> Iterator[bytes]:
+    for documents in chunks:
+        yield ''.join(json.dumps(document, ensure_ascii=False) + '\n' for document in documents).encode()
+
+
+ENCODERS: Dict[str, Callable[[Iterator[List[Dict[str, Any]]], bool], Iterator[bytes]]] = {
+    'csv': encode_csv,
+    'ndjson': encode_ndjson
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+def gzip_stream(parts: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for part in parts:
+        compressed = compressor.compress(part)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_documents(conn, query: str, args: List[Any], export_format: str,
+                     to_document: Callable[[tuple], Dict[str, Any]], compress: bool = False,
+                     header: bool = True) -> Tuple[bytes, int, Optional[tuple]]:
+    '''
+    Encodes one export page; query must be limited to EXPORT_PAGE_SIZE rows. Returns the
+    body, the number of rows and the last row, which the next page continues after
+    '''
+    count = 0
+    last: Optional[tuple] = None
+    
+    def chunks() -> Iterator[List[Dict[str, Any]]]:
+        nonlocal count, last
+        for rows in iter_rows(conn, query, args):
+            count += len(rows)
+            last = rows[-1]
+            yield [to_document(row) for row in rows]
+    
+    parts = ENCODERS[export_format](chunks(), header)
+    body = b''.join(gzip_stream(parts) if compress else parts)
+    return body, count, last
@@ -5,40 +5,451 @@ Args: event - dict with httpMethod, body, queryStringParameters, headers (X-Auth
 Returns: HTTP response with documents list or single document data
 '''
 
+import base64
 import json
 import os
-import hashlib
-import hmac
-import psycopg2
-import psycopg2.extras
-from typing import Dict, Any, Optional, List
-from datetime import datetime
-
-def verify_token(token: str) -> Optional[Dict[str, Any]]:
+from db import acquire_connection, acquire_read_connection, is_replica, primary_until, reads_from_primary, release_connection, replica_headroom
+import prepared
+import tracing
+from auth_tokens import verify_token
+import activity_log
+from search import build_search
+from export import CONTENT_TYPES, ENCODERS, EXPORT_PAGE_SIZE, export_documents
+from responses import json_response
+from cache import ResultCache, create_cache
+import stats
+import partitions
+import passports
+from typing import Dict, Any, Iterable, Optional, List
+from datetime import date, datetime
+from decimal import Decimal
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 1000
+
+DOCUMENT_FIELDS = {
+    'id': 'd.id',
+    'number': 'd.document_number',
+    'type': 'd.document_type',
+    'date': 'd.document_date',
+    'registration_date': 'd.registration_date',
+    'status': 'd.status',
+    'party1_name': 'd.party1_name',
+    'party1_passport': 'd.party1_passport',
+    'party2_name': 'd.party2_name',
+    'party2_passport': 'd.party2_passport',
+    'subject': 'd.subject',
+    'notes': 'd.notes',
+    'created_by_name': 'u.full_name'
+}
+ALL_FIELDS = list(DOCUMENT_FIELDS)
+DATE_FIELDS = ('date', 'registration_date')
+
+REQUIRED_FIELDS = ['document_type', 'document_date', 'party1_name', 'party1_passport', 'subject']
+# Text fields with their column length (None for text); passports may also come as JSON numbers
+TEXT_FIELDS = {
+    'document_type': 255, 'party1_name': 255, 'party1_passport': 50,
+    'party2_name': 255, 'party2_passport': 50, 'subject': None, 'notes': None
+}
+
+STATUS_MAP = {
+    'registered': 'Зарегистрирован',
+    'processing': 'В обработке',
+    'annulled': 'Аннулирован'
+}
+
+registry_cache = create_cache()
+
+def encode_cursor(registration_date: datetime, doc_id: int, rank: Optional[Decimal] = None) -> str:
+    position: List[Any] = [registration_date.isoformat(), doc_id]
+    if rank is not None:
+        position.insert(0, str(rank))
+    raw = json.dumps(position).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token: str, ranked: bool = False) -> Optional[tuple]:
     try:
-        secret = os.environ.get('JWT_SECRET', 'default-secret-key')
-        parts = token.split(':')
-        if len(parts) != 5:
-            return None
-        
-        user_id, email, role, expiry, signature = parts
-        payload = f"{user_id}:{email}:{role}:{expiry}"
-        expected_signature = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
-        
-        if not hmac.compare_digest(signature, expected_signature):
-            return None
-        
-        if datetime.fromisoformat(expiry) < datetime.utcnow():
-            return None
-        
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        position = json.loads(raw)
+        if ranked:
+            rank, registration_date, doc_id = position
+            return Decimal(rank), datetime.fromisoformat(registration_date), int(doc_id)
+        registration_date, doc_id = position
+        return datetime.fromisoformat(registration_date), int(doc_id)
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+
+def normalize_listing_params(params: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    doc_type = params.get('type', '').strip()
+    status_filter = params.get('status', '').strip()
+    return {
+        'search': search_term(params),
+        'type': '' if doc_type == 'all' else doc_type,
+        'status': '' if status_filter in ('', 'all-status') else STATUS_MAP.get(status_filter, status_filter),
+        'limit': int(params.get('limit') or DEFAULT_PAGE_SIZE),
+        'after': params.get('after', '').strip(),
+        'include_total': bool(params.get('include_total')),
+        'archive': is_archive(params),
+        'fields': ','.join(fields)
+    }
+
+def search_term(params: Dict[str, Any]) -> str:
+    '''
+    The one form of the search term, used for both the cache key and the query; matching is
+    case-insensitive throughout, and runs of whitespace are a single separator
+    '''
+    return ' '.join(params.get('search', '').lower().split())
+
+def is_archive(params: Dict[str, Any]) -> bool:
+    return params.get('archive', '') in ('1', 'true')
+
+def listing_cache_tags(normalized: Dict[str, Any]) -> List[str]:
+    '''
+    A new registration lands on the first page of every matching view and can appear anywhere
+    in ranked search results; later keyset pages are only affected by updates
+    '''
+    if normalized['search']:
+        scope = 'search'
+    elif normalized['after'] and not normalized['include_total']:
+        scope = 'tail'
+    else:
+        scope = 'head'
+    return ['documents', f"{scope}:{normalized['type'] or '*'}:{normalized['status'] or '*'}"]
+
+def registration_cache_tags(doc_types: Iterable[str], status: str) -> List[str]:
+    return ['stats'] + [
+        f'{scope}:{doc_type}:{status_tag}'
+        for scope in ('head', 'search')
+        for doc_type in set(doc_types) | {'*'}
+        for status_tag in (status, '*')
+    ]
+
+def build_document_filters(params: Dict[str, Any]) -> tuple:
+    search_query = search_term(params)
+    doc_type = params.get('type', '').strip()
+    status_filter = params.get('status', '').strip()
+    
+    conditions: List[str] = []
+    args: List[Any] = []
+    rank_expression: Optional[str] = None
+    rank_args: List[Any] = []
+    
+    if search_query:
+        condition, condition_args, rank_expression, rank_args = build_search(search_query)
+        conditions.append(condition)
+        args.extend(condition_args)
+    
+    if doc_type and doc_type != 'all':
+        conditions.append("d.document_type = %s")
+        args.append(doc_type)
+    
+    if status_filter and status_filter != 'all-status':
+        conditions.append("d.status = %s")
+        args.append(STATUS_MAP.get(status_filter, status_filter))
+    
+    return conditions, args, rank_expression, rank_args
+
+def allocate_document_numbers(cur, year: int, count: int = 1) -> List[int]:
+    '''
+    Gapless per-year numbering: the counter row stays locked until the caller commits,
+    so concurrent registrations queue on one row instead of scanning documents
+    '''
+    prepared.execute(cur, """
+        INSERT INTO t_p91929212_notary_registry_syst.document_number_counters AS c (year, last_value)
+        VALUES (%s, %s)
+        ON CONFLICT (year) DO UPDATE SET last_value = c.last_value + EXCLUDED.last_value
+        RETURNING last_value
+    """, (year, count))
+    last_value = cur.fetchone()[0]
+    return list(range(last_value - count + 1, last_value + 1))
+
+def format_document_number(sequence_number: int, issued_at: datetime) -> str:
+    return f"{sequence_number}N-{issued_at.strftime('%m%d')}/{issued_at.year}"
+
+def parse_fields(params: Dict[str, Any]) -> Optional[List[str]]:
+    '''fields= projection; id and registration_date are always selected because the page cursor needs them'''
+    requested = [field.strip() for field in params.get('fields', '').split(',') if field.strip()]
+    if not requested:
+        return ALL_FIELDS
+    if any(field not in DOCUMENT_FIELDS for field in requested):
+        return None
+    return ['id', 'registration_date'] + [field for field in requested if field not in ('id', 'registration_date')]
+
+def document_select(fields: List[str], extra_columns: str = '', archive: bool = False) -> str:
+    '''archive reads documents_archive, the closed years moved out of the hot table'''
+    columns = ", ".join(DOCUMENT_FIELDS[field] for field in fields)
+    table = 'documents_archive' if archive else 'documents'
+    query = f"SELECT {columns}{extra_columns} FROM t_p91929212_notary_registry_syst.{table} d"
+    if 'created_by_name' in fields:
+        query += " LEFT JOIN t_p91929212_notary_registry_syst.users u ON d.created_by = u.id"
+    return query
+
+def row_to_document(row: tuple, fields: List[str] = ALL_FIELDS) -> Dict[str, Any]:
+    document = dict(zip(fields, row))
+    for field in DATE_FIELDS:
+        if document.get(field):
+            document[field] = document[field].isoformat()
+    return document
+
+def write_headers() -> Dict[str, str]:
+    '''Headers of a committed write; X-Primary-Until keeps the writer's reads on the primary for a while'''
+    return {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'X-Primary-Until',
+        'X-Primary-Until': primary_until()
+    }
+
+def authorize_notary(event: Dict[str, Any], action: str) -> tuple:
+    '''Returns (user_data, None) for notaries and admins, otherwise (None, error response)'''
+    auth_header = (event.get('headers', {}) or {}).get('X-Auth-Token', '')
+    if not auth_header:
+        return None, {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Authentication required'})
+        }
+    
+    user_data = verify_token(auth_header)
+    if not user_data:
+        return None, {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Invalid or expired token'})
+        }
+    
+    if user_data['role'] not in ['notary', 'admin']:
+        return None, {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': f'Only notaries can {action} documents'})
+        }
+    
+    return user_data, None
+
+def change_document(cur, doc_id: int, version: int, status: Optional[str], notes: Any,
+                    user_id: int, action_type: str) -> Optional[tuple]:
+    '''
+    Conditional write on (id, version) with the audit row and the statistics move between
+    status buckets done by the same statement; returns None when the document is missing
+    or was changed since `version` was read
+    '''
+    prepared.execute(cur, """
+        WITH previous AS (
+            SELECT id, status FROM t_p91929212_notary_registry_syst.documents
+            WHERE id = %s FOR UPDATE
+        ), updated AS (
+            UPDATE t_p91929212_notary_registry_syst.documents d
+            SET status = COALESCE(%s, d.status),
+                notes = CASE WHEN %s THEN %s ELSE d.notes END,
+                version = d.version + 1
+            FROM previous
+            WHERE d.id = previous.id AND d.version = %s
+            RETURNING d.id, d.document_number, d.document_type, d.registration_date,
+                      previous.status AS previous_status, d.status, d.version
+        ), logged AS (
+            INSERT INTO t_p91929212_notary_registry_syst.activity_log (user_id, action_type, action_description, document_id)
+            SELECT %s, %s, %s || ' document ' || document_number, id FROM updated
+        ), counted AS (
+            INSERT INTO t_p91929212_notary_registry_syst.document_stats AS s (document_type, status, month, count)
+            SELECT u.document_type, moved.status, date_trunc('month', u.registration_date)::date, moved.delta
+            FROM updated u
+            CROSS JOIN LATERAL (VALUES (u.previous_status, -1), (u.status, 1)) AS moved (status, delta)
+            WHERE u.previous_status <> u.status
+            -- Buckets are locked in key order, as record_registrations does, so two opposite moves cannot deadlock
+            ORDER BY moved.status
+            ON CONFLICT (document_type, status, month) DO UPDATE SET count = s.count + EXCLUDED.count
+        )
+        SELECT id, document_number, status, version FROM updated
+    """, (
+        doc_id,
+        status, notes is not None, notes, version,
+        user_id, action_type, 'Annulled' if action_type == 'annul' else 'Updated'
+    ))
+    return cur.fetchone()
+
+def change_conflict_response(cur, doc_id: int) -> Dict[str, Any]:
+    prepared.execute(cur, "SELECT version FROM t_p91929212_notary_registry_syst.documents WHERE id = %s", (doc_id,))
+    current = cur.fetchone()
+    if not current:
         return {
-            'user_id': int(user_id),
-            'email': email,
-            'role': role
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps({'error': 'Document not found'})
         }
-    except:
-        return None
+    return {
+        'statusCode': 409,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps({'error': 'Document was modified by someone else', 'current_version': current[0]})
+    }
+
+def find_missing_field(item: Dict[str, Any]) -> Optional[str]:
+    for field in REQUIRED_FIELDS:
+        if not item.get(field):
+            return field
+    return None
+
+def validate_document(item: Any) -> Optional[str]:
+    '''
+    Returns the error for a registration that the INSERT would reject, or None. A batch is one
+    statement, so an item that fails in the database would fail every other item with it
+    '''
+    if not isinstance(item, dict):
+        return 'Missing required field: document'
+    missing = find_missing_field(item)
+    if missing:
+        return f'Missing required field: {missing}'
+    for field, max_length in TEXT_FIELDS.items():
+        value = item.get(field)
+        if value is None:
+            continue
+        if not (passports.accepted(value) if field.endswith('_passport') else isinstance(value, str)):
+            return f'{field} must be a string'
+        if max_length and len(str(value)) > max_length:
+            return f'{field} must be at most {max_length} characters'
+    document_date = item['document_date']
+    try:
+        # fromisoformat alone would also take 20240115; strptime costs more than the insert
+        if not isinstance(document_date, str) or len(document_date) != 10 or document_date[4] != '-':
+            raise ValueError
+        date.fromisoformat(document_date)
+    except ValueError:
+        return 'document_date must be a date in YYYY-MM-DD format'
+    return None
+
+def parse_registration_body(event: Dict[str, Any]) -> Any:
+    '''Returns a list of documents for a batch registration (JSON array, {"documents": [...]} or NDJSON), else a dict'''
+    headers = event.get('headers', {}) or {}
+    content_type = headers.get('Content-Type') or headers.get('content-type') or ''
+    raw_body = event.get('body', '') or ''
+    
+    if 'ndjson' in content_type:
+        return [json.loads(line) for line in raw_body.splitlines() if line.strip()]
+    
+    body_data = json.loads(raw_body or '{}')
+    if isinstance(body_data, dict) and isinstance(body_data.get('documents'), list):
+        return body_data['documents']
+    return body_data
+
+def register_documents_batch(cur, items: List[Any], user_id: int) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    valid: List[tuple] = []
+    
+    for index, item in enumerate(items):
+        error = validate_document(item)
+        if error:
+            results.append({'index': index, 'success': False, 'error': error})
+        else:
+            results.append({'index': index, 'success': True})
+            valid.append((index, item))
+    
+    if not valid:
+        return results
+    
+    issued_at = datetime.now()
+    numbers = allocate_document_numbers(cur, issued_at.year, len(valid))
+    doc_numbers = [format_document_number(number, issued_at) for number in numbers]
+    
+    import psycopg2.extras
+    
+    rows = psycopg2.extras.execute_values(cur, """
+        INSERT INTO t_p91929212_notary_registry_syst.documents 
+        (document_number, document_type, document_date, status, party1_name, party1_passport,
+         party2_name, party2_passport, subject, notes, created_by, party1_passport_hash, party2_passport_hash)
+        VALUES %s
+        RETURNING id, document_number, registration_date
+    """, [
+        (
+            doc_number,
+            item['document_type'],
+            item['document_date'],
+            'Зарегистрирован',
+            item['party1_name'],
+            item['party1_passport'],
+            item.get('party2_name'),
+            item.get('party2_passport'),
+            item['subject'],
+            item.get('notes'),
+            user_id,
+            passports.passport_hash(item['party1_passport']),
+            passports.passport_hash(item.get('party2_passport'))
+        )
+        for doc_number, (_, item) in zip(doc_numbers, valid)
+    ], page_size=len(valid), fetch=True)
+    
+    inserted = {doc_number: (doc_id, reg_date) for doc_id, doc_number, reg_date in rows}
+    
+    activity_log.write_now(cur, [
+        (user_id, 'register', f'Registered document {doc_number}', doc_id)
+        for doc_number, (doc_id, _) in inserted.items()
+    ])
+    stats.record_registrations(cur, [
+        (item['document_type'], 'Зарегистрирован', inserted[doc_number][1])
+        for doc_number, (_, item) in zip(doc_numbers, valid)
+    ])
+    
+    for doc_number, (index, _) in zip(doc_numbers, valid):
+        doc_id, reg_date = inserted[doc_number]
+        results[index]['document'] = {
+            'id': doc_id,
+            'number': doc_number,
+            'registration_date': reg_date.isoformat()
+        }
+    
+    return results
+
+def find_party_history(cur, digest: bytes, limit: int, position: Optional[tuple], archive: bool = False) -> List[tuple]:
+    '''
+    Documents with the passport on either side, newest first. Each side is read in order from
+    its partial hash index and cut at the limit before the two are merged, which keeps the
+    cost independent of the registry size; an OR over both columns would scan by date instead
+    '''
+    table = 't_p91929212_notary_registry_syst.' + ('documents_archive' if archive else 'documents')
+    bound = " AND (registration_date, id) < (%s, %s) AND registration_date <= %s" if position else ""
+    side_args: List[Any] = list(position + (position[0],)) if position else []
+    sides = [
+        f"""(SELECT id, registration_date FROM {table}
+             WHERE {column} = %s{bound}
+             ORDER BY registration_date DESC, id DESC LIMIT %s)"""
+        for column in ('party1_passport_hash', 'party2_passport_hash')
+    ]
+    query = (
+        f"WITH matches AS ({' UNION '.join(sides)}) "
+        + document_select(ALL_FIELDS, archive=archive)
+        + " JOIN matches m ON m.id = d.id AND m.registration_date = d.registration_date"
+        + " ORDER BY d.registration_date DESC, d.id DESC LIMIT %s"
+    )
+    args = ([digest] + side_args + [limit]) * 2 + [limit]
+    prepared.execute(cur, query, args)
+    return cur.fetchall()
 
+def estimate_total(cur, conditions: List[str], args: List[Any], archive: bool = False) -> int:
+    table = 't_p91929212_notary_registry_syst.' + ('documents_archive' if archive else 'documents')
+    if not conditions:
+        # A partitioned parent holds no rows itself; its partitions carry the estimates
+        cur.execute(
+            "SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint FROM pg_inherits i"
+            " JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass",
+            (table,)
+        )
+        return int(cur.fetchone()[0])
+    
+    cur.execute(
+        f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {table} d WHERE " + " AND ".join(conditions),
+        args
+    )
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+@tracing.traced
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -48,7 +459,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, X-Primary-Until',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -65,117 +476,411 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     conn = None
     try:
-        conn = psycopg2.connect(dsn)
+        query_params = event.get('queryStringParameters') or {}
+        read_primary_until = (event.get('headers') or {}).get('X-Primary-Until')
+        if method == 'GET' or (method == 'POST' and query_params.get('history') == 'passport'):
+            conn = acquire_read_connection(dsn, read_primary_until)
+        else:
+            conn = acquire_connection(dsn)
         cur = conn.cursor()
         
+        # A client inside its read-your-writes window must not be served a page cached before
+        # its write, and a page read from a replica is only kept while the replica lag plus its
+        # age in the cache stays within DB_REPLICA_MAX_LAG
+        read_cache = registry_cache if registry_cache and not reads_from_primary(read_primary_until) else None
+        cache_ttl = replica_headroom(conn)
+        write_cache = registry_cache if registry_cache and cache_ttl != 0 else None
+        
         if method == 'GET':
             params = event.get('queryStringParameters', {}) or {}
-            search_query = params.get('search', '').strip()
-            doc_type = params.get('type', '').strip()
-            status_filter = params.get('status', '').strip()
-            
-            query = """
-                SELECT d.id, d.document_number, d.document_type, d.document_date, 
-                       d.registration_date, d.status, d.party1_name, d.party1_passport,
-                       d.party2_name, d.party2_passport, d.subject, d.notes,
-                       u.full_name as created_by_name
-                FROM t_p91929212_notary_registry_syst.documents d
-                LEFT JOIN t_p91929212_notary_registry_syst.users u ON d.created_by = u.id
-                WHERE 1=1
-            """
-            
-            if search_query:
-                query += f" AND (d.document_number ILIKE '%{search_query}%' OR d.party1_name ILIKE '%{search_query}%' OR d.party2_name ILIKE '%{search_query}%')"
-            
-            if doc_type and doc_type != 'all':
-                query += f" AND d.document_type = '{doc_type}'"
-            
-            if status_filter and status_filter != 'all-status':
-                status_map = {
-                    'registered': 'Зарегистрирован',
-                    'processing': 'В обработке'
+            
+            doc_id = params.get('id', '').strip()
+            doc_number = params.get('number', '').strip()
+            if doc_id or doc_number:
+                if doc_id and not doc_id.isdigit():
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'id must be a number'})
+                    }
+                
+                query = document_select(ALL_FIELDS, ', d.version', archive=is_archive(params))
+                if doc_id:
+                    prepared.execute(cur, query + " WHERE d.id = %s", (int(doc_id),))
+                else:
+                    prepared.execute(cur, query + " WHERE d.document_number = %s ORDER BY d.id LIMIT 1", (doc_number,))
+                row = cur.fetchone()
+                
+                if not row:
+                    return {
+                        'statusCode': 404,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Document not found'})
+                    }
+                
+                document = row_to_document(row, ALL_FIELDS)
+                document['version'] = row[len(ALL_FIELDS)]
+                return json_response(event, {'document': document})
+            
+            if params.get('stats') == 'runtime':
+                user_data, error_response = authorize_notary(event, 'inspect')
+                if error_response:
+                    return error_response
+                if user_data['role'] != 'admin':
+                    return {
+                        'statusCode': 403,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Only admins can read runtime statistics'})
+                    }
+                # Counters of the process that served this request, since it started
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'cache': registry_cache.stats() if registry_cache else None,
+                        'activity_log': activity_log.metrics()
+                    })
+                }
+            
+            if params.get('stats'):
+                cache_key = ResultCache.make_key({'stats': '1'})
+                if read_cache:
+                    cached = read_cache.get(cache_key, ['documents', 'stats'])
+                    if cached is not None:
+                        return json_response(event, cached, extra_headers={'X-Cache': 'HIT'})
+                if write_cache:
+                    cache_versions = write_cache.versions(['documents', 'stats'])
+                
+                summary = stats.load_summary(cur)
+                if write_cache:
+                    write_cache.set(cache_key, ['documents', 'stats'], summary, cache_versions, cache_ttl)
+                return json_response(event, summary, extra_headers={'X-Cache': 'MISS'})
+            
+            export_format = params.get('export', '').strip()
+            if export_format:
+                if export_format not in ENCODERS:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'export must be csv or ndjson'})
+                    }
+                
+                after = params.get('after', '').strip()
+                position = decode_cursor(after) if after else None
+                if after and not position:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Invalid page cursor'})
+                    }
+                
+                conditions, args, _, _ = build_document_filters(params)
+                if position:
+                    conditions.append("(d.registration_date, d.id) < (%s, %s) AND d.registration_date <= %s")
+                    args.extend(position + (position[0],))
+                query = document_select(ALL_FIELDS, archive=is_archive(params))
+                if conditions:
+                    query += " WHERE " + " AND ".join(conditions)
+                query += " ORDER BY d.registration_date DESC, d.id DESC LIMIT %s"
+                args.append(EXPORT_PAGE_SIZE)
+                
+                compress = params.get('gzip', '') in ('1', 'true')
+                body, exported, last = export_documents(
+                    conn, query, args, export_format, row_to_document, compress, header=position is None
+                )
+                conn.rollback()
+                
+                # The rest of the registry follows from X-Next-Cursor: ?export=...&after=<cursor>
+                headers = {
+                    'Content-Type': CONTENT_TYPES[export_format],
+                    'Content-Disposition': f'attachment; filename="registry.{export_format}"',
+                    'Access-Control-Allow-Origin': '*',
+                    'Access-Control-Expose-Headers': 'X-Next-Cursor'
+                }
+                if exported == EXPORT_PAGE_SIZE and last:
+                    headers['X-Next-Cursor'] = encode_cursor(last[ALL_FIELDS.index('registration_date')], last[ALL_FIELDS.index('id')])
+                if compress:
+                    headers['Content-Encoding'] = 'gzip'
+                
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'isBase64Encoded': compress,
+                    'body': base64.b64encode(body).decode() if compress else body.decode()
                 }
-                mapped_status = status_map.get(status_filter, status_filter)
-                query += f" AND d.status = '{mapped_status}'"
             
-            query += " ORDER BY d.registration_date DESC"
+            try:
+                limit = int(params.get('limit') or DEFAULT_PAGE_SIZE)
+            except ValueError:
+                limit = 0
+            if limit < 1 or limit > MAX_PAGE_SIZE:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'})
+                }
             
-            cur.execute(query)
+            fields = parse_fields(params)
+            if fields is None:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'fields must be a subset of: ' + ', '.join(ALL_FIELDS)})
+                }
+            
+            normalized = normalize_listing_params(params, fields)
+            cache_key = ResultCache.make_key(normalized)
+            cache_tags = listing_cache_tags(normalized)
+            if read_cache:
+                cached = read_cache.get(cache_key, cache_tags)
+                if cached is not None:
+                    return json_response(event, cached, extra_headers={'X-Cache': 'HIT'})
+            if write_cache:
+                cache_versions = write_cache.versions(cache_tags)
+            
+            conditions, args, rank_expression, rank_args = build_document_filters(params)
+            total_estimate = estimate_total(cur, conditions, args, normalized['archive']) if params.get('include_total') else None
+            
+            after = params.get('after', '').strip()
+            if after:
+                position = decode_cursor(after, ranked=rank_expression is not None)
+                if not position:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Invalid page cursor'})
+                    }
+                if rank_expression:
+                    conditions.append(f"({rank_expression}, d.registration_date, d.id) < (%s, %s, %s)")
+                    args.extend(rank_args)
+                    args.extend(position)
+                else:
+                    # The plain bound lets the planner prune the partitions of later years
+                    conditions.append("(d.registration_date, d.id) < (%s, %s) AND d.registration_date <= %s")
+                    args.extend(position + (position[0],))
+            
+            query = document_select(fields, f", {rank_expression or 'NULL'} as rank", normalized['archive'])
+            args = rank_args + args
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            if rank_expression:
+                query += " ORDER BY rank DESC, d.registration_date DESC, d.id DESC LIMIT %s"
+            else:
+                query += " ORDER BY d.registration_date DESC, d.id DESC LIMIT %s"
+            args.append(limit + 1)
+            
+            prepared.execute(cur, query, args)
             rows = cur.fetchall()
             
-            documents = []
-            for row in rows:
-                documents.append({
-                    'id': row[0],
-                    'number': row[1],
-                    'type': row[2],
-                    'date': row[3].isoformat() if row[3] else None,
-                    'registration_date': row[4].isoformat() if row[4] else None,
-                    'status': row[5],
-                    'party1_name': row[6],
-                    'party1_passport': row[7],
-                    'party2_name': row[8],
-                    'party2_passport': row[9],
-                    'subject': row[10],
-                    'notes': row[11],
-                    'created_by_name': row[12]
-                })
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                last = rows[-1]
+                next_cursor = encode_cursor(last[fields.index('registration_date')], last[fields.index('id')], last[len(fields)])
             
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'documents': documents})
-            }
+            with tracing.span('serialize'):
+                documents = [row_to_document(row, fields) for row in rows]
+            
+            response_body: Dict[str, Any] = {'documents': documents, 'next_cursor': next_cursor}
+            if total_estimate is not None:
+                response_body['total_estimate'] = total_estimate
+            
+            if write_cache:
+                write_cache.set(cache_key, cache_tags, response_body, cache_versions, cache_ttl)
+            
+            return json_response(event, response_body, extra_headers={'X-Cache': 'MISS'})
         
         elif method == 'POST':
-            auth_header = event.get('headers', {}).get('X-Auth-Token', '')
-            if not auth_header:
+            history_lookup = query_params.get('history') == 'passport'
+            user_data, error_response = authorize_notary(event, 'look up party history in' if history_lookup else 'register')
+            if error_response:
+                return error_response
+            
+            if history_lookup:
+                # The passport travels in the body, so it stays out of URLs and access logs
+                history_body = json.loads(event.get('body') or '{}')
+                passport = history_body.get('passport') if isinstance(history_body, dict) else None
+                if not passports.accepted(passport) or not passports.normalize(passport):
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'passport is required'})
+                    }
+                if not passports.enabled():
+                    return {
+                        'statusCode': 500,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Passport lookup not configured'})
+                    }
+                
+                try:
+                    limit = int(query_params.get('limit') or DEFAULT_PAGE_SIZE)
+                except ValueError:
+                    limit = 0
+                if limit < 1 or limit > MAX_PAGE_SIZE:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'})
+                    }
+                
+                after = query_params.get('after', '').strip()
+                position = decode_cursor(after) if after else None
+                if after and not position:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Invalid page cursor'})
+                    }
+                
+                rows = find_party_history(cur, passports.passport_hash(passport), limit + 1, position, is_archive(query_params))
+                next_cursor = None
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    next_cursor = encode_cursor(rows[-1][ALL_FIELDS.index('registration_date')], rows[-1][ALL_FIELDS.index('id')])
                 return {
-                    'statusCode': 401,
+                    'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Authentication required'})
+                    'body': json.dumps({'documents': [row_to_document(row) for row in rows], 'next_cursor': next_cursor})
                 }
             
-            user_data = verify_token(auth_header)
-            if not user_data:
+            if query_params.get('passports') == 'backfill':
+                if user_data['role'] != 'admin':
+                    return {
+                        'statusCode': 403,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Only admins can backfill passport hashes'})
+                    }
+                if not passports.enabled() or not query_params.get('after_id', '0').isdigit():
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Set PASSPORT_HASH_KEY and pass a numeric after_id'})
+                    }
+                
+                result = passports.backfill(conn, is_archive(query_params), int(query_params.get('after_id', '0')))
                 return {
-                    'statusCode': 401,
+                    'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Invalid or expired token'})
+                    'body': json.dumps({'success': True, **result})
                 }
             
-            if user_data['role'] not in ['notary', 'admin']:
+            if query_params.get('stats') == 'reconcile':
+                if user_data['role'] != 'admin':
+                    return {
+                        'statusCode': 403,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Only admins can reconcile statistics'})
+                    }
+                
+                result = stats.reconcile(conn)
+                if registry_cache:
+                    registry_cache.invalidate(['stats'])
                 return {
-                    'statusCode': 403,
+                    'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                     'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Only notaries can register documents'})
+                    'body': json.dumps({'success': True, **result})
                 }
             
-            body_data = json.loads(event.get('body', '{}'))
+            if query_params.get('partitions') == 'maintain':
+                if user_data['role'] != 'admin':
+                    return {
+                        'statusCode': 403,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Only admins can maintain partitions'})
+                    }
+                
+                try:
+                    archive_before = datetime.strptime(query_params['archive_before'], '%Y-%m-%d').date() \
+                        if query_params.get('archive_before') else None
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'archive_before must be a YYYY-MM-DD date'})
+                    }
+                
+                result = partitions.maintain(conn, archive_before)
+                if registry_cache:
+                    registry_cache.invalidate(['documents'])
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'success': True, 'tables': result})
+                }
             
-            required_fields = ['document_type', 'document_date', 'party1_name', 'party1_passport', 'subject']
-            for field in required_fields:
-                if not body_data.get(field):
+            partitions.ensure_current_year(conn)
+            body_data = parse_registration_body(event)
+            if isinstance(body_data, list):
+                if not body_data or len(body_data) > MAX_BATCH_SIZE:
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
                         'isBase64Encoded': False,
-                        'body': json.dumps({'error': f'Missing required field: {field}'})
+                        'body': json.dumps({'error': f'Batch must contain between 1 and {MAX_BATCH_SIZE} documents'})
                     }
+                
+                results = register_documents_batch(cur, body_data, user_data['user_id'])
+                conn.commit()
+                if registry_cache:
+                    registry_cache.invalidate(registration_cache_tags(
+                        [item['document_type'] for item, result in zip(body_data, results) if result['success']],
+                        'Зарегистрирован'
+                    ))
+                registered = len([result for result in results if result['success']])
+                
+                return {
+                    'statusCode': 201 if registered else 400,
+                    'headers': write_headers(),
+                    'isBase64Encoded': False,
+                    'body': json.dumps({
+                        'success': registered == len(results),
+                        'registered': registered,
+                        'failed': len(results) - registered,
+                        'results': results
+                    })
+                }
             
-            cur.execute("SELECT COUNT(*) FROM t_p91929212_notary_registry_syst.documents")
-            count = cur.fetchone()[0]
-            doc_number = f"{count + 1}N-{datetime.now().strftime('%m%d')}/{datetime.now().year}"
+            invalid = validate_document(body_data)
+            if invalid:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': invalid})
+                }
+            
+            issued_at = datetime.now()
+            sequence_number = allocate_document_numbers(cur, issued_at.year)[0]
+            doc_number = format_document_number(sequence_number, issued_at)
             
-            cur.execute("""
+            prepared.execute(cur, """
                 INSERT INTO t_p91929212_notary_registry_syst.documents 
                 (document_number, document_type, document_date, status, party1_name, party1_passport,
-                 party2_name, party2_passport, subject, notes, created_by)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                 party2_name, party2_passport, subject, notes, created_by, party1_passport_hash, party2_passport_hash)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING id, document_number, registration_date
             """, (
                 doc_number,
@@ -188,21 +893,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 body_data.get('party2_passport'),
                 body_data['subject'],
                 body_data.get('notes'),
-                user_data['user_id']
+                user_data['user_id'],
+                passports.passport_hash(body_data['party1_passport']),
+                passports.passport_hash(body_data.get('party2_passport'))
             ))
             
             doc_id, doc_number, reg_date = cur.fetchone()
             
-            cur.execute(
-                "INSERT INTO t_p91929212_notary_registry_syst.activity_log (user_id, action_type, action_description, document_id) VALUES (%s, %s, %s, %s)",
-                (user_data['user_id'], 'register', f'Registered document {doc_number}', doc_id)
-            )
+            activity_log.write_now(cur, [(user_data['user_id'], 'register', f'Registered document {doc_number}', doc_id)])
+            stats.record_registrations(cur, [(body_data['document_type'], 'Зарегистрирован', reg_date)])
             
             conn.commit()
+            if registry_cache:
+                registry_cache.invalidate(registration_cache_tags([body_data['document_type']], 'Зарегистрирован'))
             
             return {
                 'statusCode': 201,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': write_headers(),
                 'isBase64Encoded': False,
                 'body': json.dumps({
                     'success': True,
@@ -214,6 +921,73 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 })
             }
         
+        elif method in ('PUT', 'DELETE'):
+            action = 'update' if method == 'PUT' else 'annul'
+            user_data, error_response = authorize_notary(event, action)
+            if error_response:
+                return error_response
+            
+            params = event.get('queryStringParameters', {}) or {}
+            body_data = json.loads(event.get('body') or '{}')
+            
+            try:
+                doc_id = int(body_data.get('id') or params.get('id'))
+                version = int(body_data.get('version') or params.get('version'))
+            except (TypeError, ValueError):
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'isBase64Encoded': False,
+                    'body': json.dumps({'error': 'id and version are required'})
+                }
+            
+            if method == 'PUT':
+                status = body_data.get('status')
+                if status is not None:
+                    status = STATUS_MAP.get(status, status)
+                    if status not in STATUS_MAP.values():
+                        return {
+                            'statusCode': 400,
+                            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                            'isBase64Encoded': False,
+                            'body': json.dumps({'error': f'Unknown status: {status}'})
+                        }
+                notes = body_data.get('notes')
+                if status is None and notes is None:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': 'Nothing to update: pass status and/or notes'})
+                    }
+            else:
+                status, notes = STATUS_MAP['annulled'], None
+            
+            changed = change_document(cur, doc_id, version, status, notes, user_data['user_id'], action)
+            if not changed:
+                conn.rollback()
+                return change_conflict_response(cur, doc_id)
+            
+            conn.commit()
+            if registry_cache:
+                registry_cache.invalidate(['documents'])
+            
+            doc_id, doc_number, doc_status, doc_version = changed
+            return {
+                'statusCode': 200,
+                'headers': write_headers(),
+                'isBase64Encoded': False,
+                'body': json.dumps({
+                    'success': True,
+                    'document': {
+                        'id': doc_id,
+                        'number': doc_number,
+                        'status': doc_status,
+                        'version': doc_version
+                    }
+                })
+            }
+        
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -229,4 +1003,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            if not is_replica(conn):
+                activity_log.flush_pending(conn)
+            release_connection(conn)
\ No newline at end of file
@@ -0,0 +1,98 @@
+'''
+Yearly partitions of documents (by registration_date) and activity_log (by created_at).
+Maintenance creates the coming years ahead of time, so rows never pile up in the DEFAULT
+partition, and can move closed years to documents_archive / activity_log_archive: they
+drop out of the hot listing and feed plans but stay queryable with ?archive=1
+
+Creation needs no scheduler: the first registration a process handles in a calendar year
+checks that year's partitions and runs maintain() if they are missing (once per process
+and year). Admins can still run it ahead of time, and archiving, with
+POST ?partitions=maintain
+Config: PARTITION_YEARS_AHEAD - future yearly partitions kept in place (default 2)
+        ARCHIVE_TABLESPACE - tablespace archived partitions are moved to, e.g. one on a
+                             compressed or cheaper volume (default: left where they are)
+'''
+
+import os
+from datetime import date
+from typing import Dict, Optional
+
+import psycopg2
+
+PARTITIONED_TABLES = ('documents', 'activity_log')
+YEARS_AHEAD = int(os.environ.get('PARTITION_YEARS_AHEAD', '2'))
+
+_checked_year: Optional[int] = None
+
+
+def logger():
+    # logging is imported lazily, it is needed only when on-demand maintenance fails
+    import logging
+    return logging.getLogger('partitions')
+
+
+def maintain(conn, archive_before: Optional[date] = None) -> Dict[str, Dict[str, int]]:
+    '''
+    Ensures partitions up to YEARS_AHEAD years past the current one and, with archive_before,
+    archives every partition that ends on or before that date. Detaching and attaching take
+    short exclusive locks on the parent tables, so run it off-peak
+    '''
+    today = date.today()
+    until = date(today.year + YEARS_AHEAD + 1, 1, 1)
+    tablespace = os.environ.get('ARCHIVE_TABLESPACE') or None
+    result: Dict[str, Dict[str, int]] = {}
+    cur = conn.cursor()
+    try:
+        # Concurrent runs queue up here instead of both detaching the default partition
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('t_p91929212_notary_registry_syst.partitions'))")
+        for table in PARTITIONED_TABLES:
+            cur.execute(
+                "SELECT t_p91929212_notary_registry_syst.ensure_partitions(%s, %s, %s)",
+                (table, date(today.year, 1, 1), until)
+            )
+            created = cur.fetchone()[0]
+            archived = 0
+            if archive_before:
+                cur.execute(
+                    "SELECT t_p91929212_notary_registry_syst.archive_partitions(%s, %s, %s)",
+                    (table, archive_before, tablespace)
+                )
+                archived = cur.fetchone()[0]
+            result[table] = {'created': created, 'archived': archived}
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return result
+
+
+def ensure_current_year(conn) -> None:
+    '''
+    Runs maintain() when the current year's partitions are missing; after the first check a
+    process does nothing until the year changes. Failures are logged, not raised: without
+    the partition rows still land in the DEFAULT one
+    '''
+    global _checked_year
+    year = date.today().year
+    if _checked_year == year:
+        return
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            "SELECT bool_and(to_regclass(format('t_p91929212_notary_registry_syst.%%I', t || '_' || %s)) IS NOT NULL) "
+            "FROM unnest(%s::text[]) AS t",
+            (str(year), list(PARTITIONED_TABLES))
+        )
+        present = cur.fetchone()[0]
+        conn.commit()
+        if not present:
+            logger().warning('partitions for %s are missing, creating them', year)
+            maintain(conn)
+        _checked_year = year
+    except psycopg2.Error:
+        conn.rollback()
+        logger().exception('on-demand partition maintenance failed')
+    finally:
+        cur.close()
@@ -0,0 +1,91 @@
+'''
+Party passports are looked up through keyed hashes: HMAC-SHA256 of the normalized number
+(digits and letters only, upper-cased), truncated to 16 bytes and stored next to each
+side's passport, so the history lookup's index and query parameters carry only the hash.
+The passport itself is posted in the request body, never in the URL; slow-query logs
+do not see it because tracing redacts literals and never logs parameters
+Config: PASSPORT_HASH_KEY - secret HMAC key; without it new rows get no hashes and the
+                            party history lookup is unavailable. Changing it requires
+                            clearing the hashes and backfilling again
+        PASSPORT_BACKFILL_BATCH_SIZE - rows updated per batch by backfill() (default 5000)
+'''
+
+import hashlib
+import hmac
+import os
+from typing import Any, Dict, Optional
+
+PASSPORT_HASH_KEY = os.environ.get('PASSPORT_HASH_KEY', '').encode()
+BACKFILL_BATCH_SIZE = int(os.environ.get('PASSPORT_BACKFILL_BATCH_SIZE', '5000'))
+
+
+def enabled() -> bool:
+    return bool(PASSPORT_HASH_KEY)
+
+
+def accepted(passport: Any) -> bool:
+    '''Passports arrive as strings or, from some clients, as JSON numbers'''
+    return isinstance(passport, str) or (isinstance(passport, int) and not isinstance(passport, bool))
+
+
+def normalize(passport: Any) -> str:
+    '''
+    "1234 567890", "1234-567890" and "1234567890" are the same passport; a number from a
+    JSON body is taken as its text, which is also what the passport column stores
+    '''
+    if passport is None:
+        return ''
+    return ''.join(char for char in str(passport) if char.isalnum()).upper()
+
+
+def passport_hash(passport: Any) -> Optional[bytes]:
+    normalized = normalize(passport)
+    if not normalized or not PASSPORT_HASH_KEY:
+        return None
+    return hmac.new(PASSPORT_HASH_KEY, normalized.encode(), hashlib.sha256).digest()[:16]
+
+
+def backfill(conn, archive: bool = False, after_id: int = 0, max_batches: int = 10) -> Dict[str, Any]:
+    '''
+    Fills in the hashes of rows registered before the columns existed, in id order and one
+    committed batch at a time, so row locks stay short. Returns the number of rows updated
+    and the id to resume from, None once the table is done
+    '''
+    import psycopg2.extras
+    table = 't_p91929212_notary_registry_syst.' + ('documents_archive' if archive else 'documents')
+    updated = 0
+    cur = conn.cursor()
+    try:
+        for _ in range(max_batches):
+            cur.execute(f"""
+                SELECT id, registration_date, party1_passport, party2_passport
+                FROM {table}
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (after_id, BACKFILL_BATCH_SIZE))
+            rows = cur.fetchall()
+            if not rows:
+                conn.commit()
+                return {'updated': updated, 'next_after_id': None}
+
+            psycopg2.extras.execute_values(cur, f"""
+                UPDATE {table} d
+                SET party1_passport_hash = v.party1_hash, party2_passport_hash = v.party2_hash
+                FROM (VALUES %s) AS v (id, registration_date, party1_hash, party2_hash)
+                WHERE d.id = v.id AND d.registration_date = v.registration_date
+                  AND (d.party1_passport_hash IS DISTINCT FROM v.party1_hash
+                       OR d.party2_passport_hash IS DISTINCT FROM v.party2_hash)
+            """, [
+                (doc_id, reg_date, passport_hash(party1), passport_hash(party2))
+                for doc_id, reg_date, party1, party2 in rows
+            ], template='(%s, %s::timestamp, %s::bytea, %s::bytea)', page_size=len(rows))
+            updated += cur.rowcount
+            conn.commit()
+            after_id = rows[-1][0]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return {'updated': updated, 'next_after_id': after_id}
@@ -0,0 +1,92 @@
+'''
+JSON response encoding with Accept-Encoding negotiation and ETag revalidation
+orjson and brotli are used when installed; stdlib json and gzip otherwise
+'''
+
+import base64
+import gzip
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+import tracing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_BYTES = 1024
+
+
+def encode_json(payload: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def _header(event: Dict[str, Any], name: str) -> str:
+    headers = event.get('headers', {}) or {}
+    return headers.get(name) or headers.get(name.lower()) or ''
+
+
+def _accepted_encodings(event: Dict[str, Any]) -> set:
+    accepted = set()
+    for part in _header(event, 'Accept-Encoding').split(','):
+        coding, _, quality = part.strip().partition(';')
+        if coding and quality.replace(' ', '') not in ('q=0', 'q=0.0'):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _etag_matches(event: Dict[str, Any], etag: str) -> bool:
+    if_none_match = _header(event, 'If-None-Match')
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or etag.replace('W/', '') in candidates
+
+
+def json_response(event: Dict[str, Any], payload: Any, status_code: int = 200,
+                  extra_headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    '''Encoded, optionally compressed response; replies 304 when If-None-Match carries the current ETag'''
+    with tracing.span('serialize'):
+        body = encode_json(payload)
+    etag = 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag, X-Cache',
+        'ETag': etag,
+        'Vary': 'Accept-Encoding'
+    }
+    headers.update(extra_headers or {})
+    
+    if status_code == 200 and _etag_matches(event, etag):
+        return {'statusCode': 304, 'headers': headers, 'isBase64Encoded': False, 'body': ''}
+    
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        accepted = _accepted_encodings(event)
+        if brotli is not None and 'br' in accepted:
+            headers['Content-Encoding'] = 'br'
+            return {
+                'statusCode': status_code,
+                'headers': headers,
+                'isBase64Encoded': True,
+                'body': base64.b64encode(brotli.compress(body, quality=4)).decode()
+            }
+        if 'gzip' in accepted:
+            headers['Content-Encoding'] = 'gzip'
+            return {
+                'statusCode': status_code,
+                'headers': headers,
+                'isBase64Encoded': True,
+                'body': base64.b64encode(gzip.compress(body, compresslevel=5)).decode()
+            }
+    
+    return {'statusCode': status_code, 'headers': headers, 'isBase64Encoded': False, 'body': body.decode()}
@@ -0,0 +1,39 @@
+'''
+Parameterized registry search backed by trigram and Russian full-text indexes
+(see db_migrations/V0003__add_documents_search_indexes.sql)
+'''
+
+from typing import Any, List, Tuple
+
+MAX_SEARCH_LENGTH = 200
+
+
+def escape_like(term: str) -> str:
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_search(term: str) -> Tuple[str, List[Any], str, List[Any]]:
+    '''
+    Returns (condition, condition_args, rank_expression, rank_args).
+    Substring matches on the number and party names are served by the gin_trgm_ops
+    indexes, word-form matches on party names by the tsvector index.
+    The rank is rounded to numeric so it survives a round trip through a page cursor.
+    '''
+    term = term[:MAX_SEARCH_LENGTH]
+    pattern = f'%{escape_like(term)}%'
+    
+    condition = (
+        "(d.document_number ILIKE %s OR d.party1_name ILIKE %s OR d.party2_name ILIKE %s"
+        " OR d.party_search_vector @@ plainto_tsquery('russian', %s))"
+    )
+    condition_args: List[Any] = [pattern, pattern, pattern, term]
+    
+    rank_expression = (
+        "round((ts_rank(d.party_search_vector, plainto_tsquery('russian', %s))"
+        " + greatest(similarity(d.document_number, %s),"
+        " word_similarity(%s, d.party1_name),"
+        " word_similarity(%s, coalesce(d.party2_name, ''))))::numeric, 6)"
+    )
+    rank_args: List[Any] = [term, term, term, term]
+    
+    return condition, condition_args, rank_expression, rank_args
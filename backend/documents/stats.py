@@ -0,0 +1,106 @@
+'''
+Registry statistics: document counts per (type, status, registration month) kept in
+document_stats, bumped in the same transaction as every registration or status change
+and periodically rebuilt from the documents table to repair any drift
+'''
+
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+import prepared
+
+BUCKET_UPSERT = """
+    INSERT INTO t_p91929212_notary_registry_syst.document_stats AS s (document_type, status, month, count)
+    VALUES %s
+    ON CONFLICT (document_type, status, month) DO UPDATE SET count = s.count + EXCLUDED.count
+"""
+
+
+def month_of(value: datetime):
+    return value.date().replace(day=1)
+
+
+def record_registrations(cur, documents: Iterable[Tuple[str, str, datetime]]) -> None:
+    '''Adds (document_type, status, registration_date) rows to their buckets, one statement per batch'''
+    buckets = Counter((doc_type, status, month_of(reg_date)) for doc_type, status, reg_date in documents)
+    if not buckets:
+        return
+    import psycopg2.extras
+    psycopg2.extras.execute_values(
+        cur, BUCKET_UPSERT,
+        [(doc_type, status, month, count) for (doc_type, status, month), count in sorted(buckets.items())],
+        page_size=len(buckets)
+    )
+
+
+def load_summary(cur) -> Dict[str, Any]:
+    prepared.execute(cur, """
+        SELECT document_type, status, month, count
+        FROM t_p91929212_notary_registry_syst.document_stats
+        WHERE count <> 0
+        ORDER BY month, document_type, status
+    """)
+    by_type: Counter = Counter()
+    by_status: Counter = Counter()
+    by_month: Counter = Counter()
+    buckets: List[Dict[str, Any]] = []
+    
+    for doc_type, status, month, count in cur.fetchall():
+        month_key = month.strftime('%Y-%m')
+        by_type[doc_type] += count
+        by_status[status] += count
+        by_month[month_key] += count
+        buckets.append({'type': doc_type, 'status': status, 'month': month_key, 'count': count})
+    
+    return {
+        'total': sum(by_type.values()),
+        'by_type': dict(by_type.most_common()),
+        'by_status': dict(by_status.most_common()),
+        'by_month': dict(by_month),
+        'buckets': buckets
+    }
+
+
+def reconcile(conn) -> Dict[str, int]:
+    '''
+    Rebuilds document_stats from a full aggregate of documents, archived years included. The table lock waits for
+    in-flight writers and holds off new ones until commit, so no increment is lost
+    between the aggregate snapshot and the rewrite
+    '''
+    cur = conn.cursor()
+    try:
+        cur.execute("LOCK TABLE t_p91929212_notary_registry_syst.document_stats IN SHARE ROW EXCLUSIVE MODE")
+        cur.execute("""
+            WITH actual AS (
+                SELECT document_type, status, date_trunc('month', registration_date)::date AS month, COUNT(*) AS count
+                FROM (
+                    SELECT document_type, status, registration_date FROM t_p91929212_notary_registry_syst.documents
+                    UNION ALL
+                    SELECT document_type, status, registration_date FROM t_p91929212_notary_registry_syst.documents_archive
+                ) registry
+                GROUP BY 1, 2, 3
+            ), corrected AS (
+                INSERT INTO t_p91929212_notary_registry_syst.document_stats AS s (document_type, status, month, count)
+                SELECT document_type, status, month, count FROM actual
+                ON CONFLICT (document_type, status, month) DO UPDATE SET count = EXCLUDED.count
+                WHERE s.count <> EXCLUDED.count
+                RETURNING 1
+            ), removed AS (
+                DELETE FROM t_p91929212_notary_registry_syst.document_stats s
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM actual a
+                    WHERE a.document_type = s.document_type AND a.status = s.status AND a.month = s.month
+                )
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM corrected), (SELECT COUNT(*) FROM removed)
+        """)
+        corrected, removed = cur.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return {'corrected': corrected, 'removed': removed}
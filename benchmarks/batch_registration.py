@@ -0,0 +1,113 @@
+'''
+Throughput of batch registration against looping the single-document path
+Usage: BENCH_DATABASE_URL=postgresql://... python benchmarks/batch_registration.py [--documents 2000] [--batch-size 500]
+           [--min-speedup 50] [--round-trip-ms 0]
+Registers the same number of documents through the documents handler twice, one POST per
+document and then --batch-size documents per POST, and reports documents/s for both and
+their ratio; exits non-zero when the ratio is below --min-speedup. Handlers run in process,
+so by default the network round trip and function invocation every POST pays on the
+platform are left out and the ratio is a lower bound; --round-trip-ms adds that cost to
+each POST of both runs.
+'''
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Any, Dict, List
+
+import psycopg2
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'gateway'))
+import gateway  # noqa: E402
+
+SCHEMA = 't_p91929212_notary_registry_syst'
+
+
+def make_document(marker: str, n: int) -> Dict[str, Any]:
+    return {
+        'document_type': 'Доверенность',
+        'document_date': '2024-01-15',
+        'party1_name': f'Пакетный Импорт {n}',
+        'party1_passport': f'{n % 10000:04d} {n % 1000000:06d}',
+        'subject': marker
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documents', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--min-speedup', type=float, default=50)
+    parser.add_argument('--round-trip-ms', type=float, default=0)
+    args = parser.parse_args()
+    
+    dsn = os.environ.get('BENCH_DATABASE_URL')
+    if not dsn:
+        sys.exit('BENCH_DATABASE_URL is not set')
+    os.environ['DATABASE_URL'] = dsn
+    
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, email, role FROM {SCHEMA}.users WHERE role IN ('notary', 'admin') ORDER BY id LIMIT 1")
+    user = cur.fetchone()
+    if not user:
+        sys.exit('No notary or admin user to register documents with')
+    sys.path.insert(0, os.path.join(ROOT, 'backend', 'auth'))
+    import auth_tokens
+    token = auth_tokens.generate_token(*user)
+    handler = gateway.load_functions(ROOT)['documents'].handler
+    marker = f'BATCH-CHECK {uuid.uuid4().hex[:8]}'
+    
+    def post(body: Any) -> Dict[str, Any]:
+        event = {'httpMethod': 'POST', 'headers': {'X-Auth-Token': token}, 'body': json.dumps(body)}
+        if args.round_trip_ms:
+            time.sleep(args.round_trip_ms / 1000)
+        return handler(event, gateway.Context('documents'))
+    
+    # Warm the pool, prepared statements and token cache so neither side pays them
+    post(make_document(marker, 0))
+    
+    started = time.perf_counter()
+    single_failed = len([n for n in range(args.documents) if post(make_document(marker, n))['statusCode'] != 201])
+    single_elapsed = time.perf_counter() - started
+    
+    batches: List[List[Dict[str, Any]]] = [
+        [make_document(marker, n) for n in range(offset, min(offset + args.batch_size, args.documents))]
+        for offset in range(0, args.documents, args.batch_size)
+    ]
+    started = time.perf_counter()
+    batch_failed = 0
+    for batch in batches:
+        response = post({'documents': batch})
+        batch_failed += json.loads(response['body']).get('failed', len(batch)) if response['statusCode'] == 201 else len(batch)
+    batch_elapsed = time.perf_counter() - started
+    
+    single_rate = args.documents / single_elapsed
+    batch_rate = args.documents / batch_elapsed
+    speedup = batch_rate / single_rate
+    print(f"single: {args.documents} documents in {single_elapsed:.2f}s ({single_rate:.0f} docs/s), failed: {single_failed}")
+    print(f"batch:  {args.documents} documents in {batch_elapsed:.2f}s ({batch_rate:.0f} docs/s) "
+          f"as {len(batches)} x {args.batch_size}, failed: {batch_failed}")
+    print(f"speedup: {speedup:.1f}x (required {args.min_speedup:g}x, round trip {args.round_trip_ms:g} ms per POST)")
+    
+    cur.execute(
+        f"DELETE FROM {SCHEMA}.activity_log WHERE document_id IN (SELECT id FROM {SCHEMA}.documents WHERE subject = %s)",
+        (marker,)
+    )
+    cur.execute(f"DELETE FROM {SCHEMA}.documents WHERE subject = %s", (marker,))
+    conn.commit()
+    sys.path.insert(0, os.path.join(ROOT, 'backend', 'documents'))
+    import stats
+    stats.reconcile(conn)
+    conn.close()
+    
+    if single_failed or batch_failed or speedup < args.min_speedup:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
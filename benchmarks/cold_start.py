@@ -0,0 +1,114 @@
+'''
+Cold-start benchmark: every run is a fresh interpreter that imports one function's index.py
+and serves its first request, as a new container would. Prints the heaviest imports from
+python -X importtime, then median import / first-request / total times per function.
+Usage: python benchmarks/cold_start.py [--runs 15] [--top 12] [--functions auth,documents,activity]
+Without BENCH_DATABASE_URL the first request is an OPTIONS preflight (imports only);
+with it, a real read is served and each function is also measured with DB_PREWARM=on.
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import index
+imported = time.perf_counter()
+event = json.loads(sys.argv[2])
+if event.pop('token', False):
+    import auth_tokens
+    event['headers'] = {'X-Auth-Token': auth_tokens.generate_token(1, 'bench1@example.ru', 'admin')}
+
+class Context:
+    request_id = 'cold-start'
+    function_name = 'cold-start'
+
+response = index.handler(event, Context())
+finished = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'first_request_ms': (finished - imported) * 1000,
+                  'status': response['statusCode']}))
+'''
+
+EVENTS = {
+    'auth': {'httpMethod': 'GET', 'token': True},
+    'documents': {'httpMethod': 'GET', 'queryStringParameters': {'limit': '10'}},
+    'activity': {'httpMethod': 'GET', 'token': True, 'queryStringParameters': {'limit': '10'}},
+}
+
+
+def import_profile(directory: str, top: int) -> List[Tuple[int, int, str]]:
+    '''Returns (cumulative us, self us, module) for the slowest imports under the function'''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import sys; sys.path.insert(0, {directory!r}); import index'],
+        capture_output=True, text=True, cwd=directory
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module = (part.strip() for part in line[len('import time:'):].split('|'))
+        rows.append((int(cumulative_us), int(self_us), module))
+    return sorted(rows, reverse=True)[:top]
+
+
+def cold_start(directory: str, event: Dict[str, Any], env: Dict[str, str]) -> Dict[str, Any]:
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, directory, json.dumps(event)],
+        capture_output=True, text=True, cwd=directory, env=env
+    )
+    if result.returncode != 0:
+        sys.exit(result.stderr)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def report(name: str, samples: List[Dict[str, Any]]) -> None:
+    imports = statistics.median(sample['import_ms'] for sample in samples)
+    first = statistics.median(sample['first_request_ms'] for sample in samples)
+    total = statistics.median(sample['import_ms'] + sample['first_request_ms'] for sample in samples)
+    statuses = sorted({sample['status'] for sample in samples})
+    print(f'{name:<22}{imports:>10.1f}{first:>12.1f}{total:>10.1f}   {statuses}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=15)
+    parser.add_argument('--top', type=int, default=12)
+    parser.add_argument('--functions', default='auth,documents,activity')
+    args = parser.parse_args()
+
+    dsn = os.environ.get('BENCH_DATABASE_URL')
+    base_env = {key: value for key, value in os.environ.items() if key not in ('DATABASE_URL', 'DB_PREWARM')}
+    if dsn:
+        base_env['DATABASE_URL'] = dsn
+
+    functions = args.functions.split(',')
+    for name in functions:
+        print(f'== {name}: slowest imports (cumulative / self, ms)')
+        for cumulative_us, self_us, module in import_profile(os.path.join(ROOT, 'backend', name), args.top):
+            print(f'{cumulative_us / 1000:>9.1f}{self_us / 1000:>9.1f}  {module}')
+        print()
+
+    modes = [('', {})]
+    if dsn:
+        modes.append((' +prewarm', {'DB_PREWARM': 'on'}))
+
+    print(f"{'function':<22}{'import ms':>10}{'1st req ms':>12}{'total ms':>10}   statuses")
+    for name in functions:
+        directory = os.path.join(ROOT, 'backend', name)
+        event = EVENTS[name] if dsn else {'httpMethod': 'OPTIONS'}
+        for suffix, extra_env in modes:
+            samples = [cold_start(directory, event, {**base_env, **extra_env}) for _ in range(args.runs)]
+            report(name + suffix, samples)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+'''
+Load test for the cloud functions listed in backend/func2url.json
+Usage:
+  BENCH_DATABASE_URL=postgresql://... python benchmarks/load_test.py --init-schema --seed --documents 100000 --activities 1000000
+  BENCH_DATABASE_URL=postgresql://... python benchmarks/load_test.py --mix list=50,search=20,activity=15,login=10,register=5 \\
+      --concurrency 16 --requests 5000 --compare benchmarks/results/<previous>.json
+Handlers are invoked in process with the same event/context contract the platform uses, against a
+scratch PostgreSQL (e.g. a local container) built from benchmarks/schema.sql plus db_migrations/.
+Results are written to benchmarks/results/<commit>-<timestamp>.json.
+'''
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Tuple
+
+import psycopg2
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'gateway'))
+import gateway  # noqa: E402
+
+SCHEMA = 't_p91929212_notary_registry_syst'
+BENCH_PASSWORD = 'bench-password'
+DOCUMENT_TYPES = ['Договор купли-продажи', 'Доверенность', 'Завещание', 'Договор дарения']
+SURNAMES = ['Иванов', 'Петров', 'Сидоров', 'Кузнецов', 'Смирнов', 'Попов', 'Васильев', 'Соколов']
+
+
+def load_handlers() -> Dict[str, Callable[[Dict[str, Any], Any], Dict[str, Any]]]:
+    '''Import every function's index.py with its own sibling modules, as each is deployed separately'''
+    return {name: function.handler for name, function in gateway.load_functions(ROOT).items()}
+
+
+def init_schema(conn) -> None:
+    cur = conn.cursor()
+    with open(os.path.join(ROOT, 'benchmarks', 'schema.sql')) as f:
+        cur.execute(f.read())
+    for path in sorted(glob.glob(os.path.join(ROOT, 'db_migrations', 'V*.sql'))):
+        with open(path) as f:
+            cur.execute(f.read())
+        print(f'applied {os.path.basename(path)}')
+    conn.commit()
+
+
+def seed(conn, users: int, documents: int, activities: int) -> None:
+    sys.path.insert(0, os.path.join(ROOT, 'backend', 'auth'))
+    import passwords
+    password_hash = passwords.hash_password(BENCH_PASSWORD)
+    
+    cur = conn.cursor()
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.users (email, password_hash, full_name, role, phone, region)
+        SELECT 'bench' || g || '@example.ru', %s, 'Нотариус ' || g,
+               CASE WHEN g %% 20 = 0 THEN 'admin' ELSE 'notary' END,
+               '+7900' || lpad(g::text, 7, '0'),
+               (ARRAY['Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск'])[1 + g %% 4]
+        FROM generate_series(1, %s) AS g
+        ON CONFLICT (email) DO NOTHING
+    """, (password_hash, users))
+    cur.execute(f"SELECT min(id), max(id) FROM {SCHEMA}.users WHERE email LIKE 'bench%%@example.ru'")
+    first_user, last_user = cur.fetchone()
+    
+    # Synthetic rows start in 2022; give those years their own partitions instead of the default one
+    for table in ('documents', 'activity_log'):
+        cur.execute(f"SELECT {SCHEMA}.ensure_partitions(%s, DATE '2022-01-01', CURRENT_DATE)", (table,))
+    conn.commit()
+    
+    for offset in range(0, documents, 100000):
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}.documents
+            (document_number, document_type, document_date, registration_date, status, party1_name, party1_passport,
+             party2_name, party2_passport, subject, created_by)
+            SELECT 'S' || g || 'N-0101/2024',
+                   (%s::text[])[1 + g %% 4],
+                   DATE '2022-01-01' + (g %% 1000),
+                   TIMESTAMP '2022-01-01' + (g * interval '1 minute'),
+                   (ARRAY['Зарегистрирован', 'В обработке'])[1 + g %% 2],
+                   (%s::text[])[1 + g %% 8] || ' ' || md5(g::text),
+                   lpad((g %% 10000)::text, 4, '0') || ' ' || lpad(g::text, 6, '0'),
+                   (%s::text[])[1 + (g / 8) %% 8] || 'а ' || md5((g * 7)::text),
+                   lpad((g %% 9999)::text, 4, '0') || ' ' || lpad((g * 3)::text, 6, '0'),
+                   'Синтетический документ ' || g,
+                   %s + g %% (%s - %s + 1)
+            FROM generate_series(%s, %s) AS g
+        """, (DOCUMENT_TYPES, SURNAMES, SURNAMES, first_user, last_user, first_user,
+              offset + 1, min(offset + 100000, documents)))
+        conn.commit()
+    
+    cur.execute(f"SELECT min(id), max(id) FROM {SCHEMA}.documents")
+    first_document, last_document = cur.fetchone()
+    for offset in range(0, activities, 500000):
+        cur.execute(f"""
+            INSERT INTO {SCHEMA}.activity_log (user_id, action_type, action_description, document_id, created_at)
+            SELECT %s + g %% (%s - %s + 1),
+                   CASE WHEN g %% 3 = 0 THEN 'register' ELSE 'login' END,
+                   'Synthetic activity ' || g,
+                   CASE WHEN g %% 3 = 0 THEN %s + g %% (%s - %s + 1) END,
+                   TIMESTAMP '2022-01-01' + (g * interval '30 seconds')
+            FROM generate_series(%s, %s) AS g
+        """, (first_user, last_user, first_user, first_document, last_document, first_document,
+              offset + 1, min(offset + 500000, activities)))
+        conn.commit()
+    
+    sys.path.insert(0, os.path.join(ROOT, 'backend', 'documents'))
+    import stats
+    stats.reconcile(conn)
+    
+    import passports
+    if passports.enabled():
+        after_id = 0
+        while after_id is not None:
+            after_id = passports.backfill(conn, after_id=after_id)['next_after_id']
+    
+    cur.execute(f"ANALYZE {SCHEMA}.users; ANALYZE {SCHEMA}.documents; ANALYZE {SCHEMA}.activity_log")
+    conn.commit()
+    print(f'seeded {users} users, {documents} documents, {activities} activity rows')
+
+
+class Scenario:
+    def __init__(self, conn):
+        cur = conn.cursor()
+        cur.execute(f"SELECT id, email, role FROM {SCHEMA}.users WHERE email LIKE 'bench%%@example.ru' ORDER BY id")
+        self.users = cur.fetchall()
+        if not self.users:
+            sys.exit('No benchmark users, run with --seed first')
+        sys.path.insert(0, os.path.join(ROOT, 'backend', 'auth'))
+        import auth_tokens
+        self.tokens = [auth_tokens.generate_token(*user) for user in self.users if user[2] in ('notary', 'admin')]
+    
+    def login(self) -> Tuple[str, Dict[str, Any]]:
+        email = random.choice(self.users)[1]
+        return 'auth', {'httpMethod': 'POST', 'body': json.dumps({'email': email, 'password': BENCH_PASSWORD})}
+    
+    def me(self) -> Tuple[str, Dict[str, Any]]:
+        return 'auth', {'httpMethod': 'GET', 'headers': {'X-Auth-Token': random.choice(self.tokens)}}
+    
+    def list(self) -> Tuple[str, Dict[str, Any]]:
+        params = random.choice([{}, {'type': random.choice(DOCUMENT_TYPES)}, {'status': 'registered'}])
+        return 'documents', {'httpMethod': 'GET', 'queryStringParameters': params}
+    
+    def search(self) -> Tuple[str, Dict[str, Any]]:
+        term = random.choice([random.choice(SURNAMES), f'S{random.randint(1, 100000)}N'])
+        return 'documents', {'httpMethod': 'GET', 'queryStringParameters': {'search': term}}
+    
+    def register(self) -> Tuple[str, Dict[str, Any]]:
+        return 'documents', {
+            'httpMethod': 'POST',
+            'headers': {'X-Auth-Token': random.choice(self.tokens)},
+            'body': json.dumps({
+                'document_type': random.choice(DOCUMENT_TYPES),
+                'document_date': '2024-01-15',
+                'party1_name': f'{random.choice(SURNAMES)} Нагрузочный',
+                'party1_passport': f'{random.randint(1000, 9999)} {random.randint(100000, 999999)}',
+                'subject': 'Нагрузочный тест'
+            })
+        }
+    
+    def stats(self) -> Tuple[str, Dict[str, Any]]:
+        return 'documents', {'httpMethod': 'GET', 'queryStringParameters': {'stats': '1'}}
+    
+    def history(self) -> Tuple[str, Dict[str, Any]]:
+        # Seeded party1 passports are '<g mod 10000, 4 digits> <g, 6 digits>'; needs PASSPORT_HASH_KEY
+        g = random.randint(1, 10000)
+        return 'documents', {
+            'httpMethod': 'POST',
+            'headers': {'X-Auth-Token': random.choice(self.tokens)},
+            'queryStringParameters': {'history': 'passport'},
+            'body': json.dumps({'passport': f'{g % 10000:04d} {g:06d}'})
+        }
+    
+    def activity(self) -> Tuple[str, Dict[str, Any]]:
+        return 'activity', {'httpMethod': 'GET', 'headers': {'X-Auth-Token': random.choice(self.tokens)}}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run(handlers, scenario: Scenario, mix: Dict[str, int], concurrency: int, requests: int) -> Dict[str, Any]:
+    operations = random.choices(list(mix), weights=list(mix.values()), k=requests)
+    
+    def invoke(operation: str) -> Tuple[str, float, int]:
+        function_name, event = getattr(scenario, operation)()
+        started = time.perf_counter()
+        response = handlers[function_name](event, gateway.Context(function_name))
+        return operation, (time.perf_counter() - started) * 1000, response['statusCode']
+    
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(invoke, operations))
+    elapsed = time.perf_counter() - started
+    
+    by_operation: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+    for operation, latency, status in samples:
+        by_operation[operation].append((latency, status))
+    
+    report = {}
+    for operation, results in sorted(by_operation.items()):
+        latencies = [latency for latency, _ in results]
+        report[operation] = {
+            'requests': len(results),
+            'errors': len([status for _, status in results if status >= 400]),
+            'throughput': len(results) / elapsed,
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99)
+        }
+    return {'elapsed_s': elapsed, 'total_throughput': len(samples) / elapsed, 'operations': report}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(result: Dict[str, Any], baseline: Dict[str, Any] = None) -> None:
+    print(f"{'operation':<10} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for operation, stats in result['operations'].items():
+        line = (f"{operation:<10} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput']:>8.1f} "
+                f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+        previous = (baseline or {}).get('operations', {}).get(operation)
+        if previous:
+            change = (stats['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] * 100 if previous['p95_ms'] else 0
+            line += f"   p95 {change:+.0f}% vs {baseline['commit']}"
+        print(line)
+    print(f"total: {result['total_throughput']:.1f} req/s over {result['elapsed_s']:.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--init-schema', action='store_true')
+    parser.add_argument('--seed', action='store_true')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--documents', type=int, default=10000)
+    parser.add_argument('--activities', type=int, default=100000)
+    parser.add_argument('--mix', default='list=50,search=20,activity=15,login=10,register=5')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--compare', help='earlier results file to compare p95 against')
+    args = parser.parse_args()
+    
+    dsn = os.environ.get('BENCH_DATABASE_URL')
+    if not dsn:
+        sys.exit('BENCH_DATABASE_URL is not set')
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.concurrency))
+    os.environ.setdefault('LOGIN_ATTEMPTS_PER_MINUTE', '1000000')
+    
+    conn = psycopg2.connect(dsn)
+    if args.init_schema:
+        init_schema(conn)
+    if args.seed:
+        seed(conn, args.users, args.documents, args.activities)
+    
+    mix = {name: int(weight) for name, weight in (part.split('=') for part in args.mix.split(','))}
+    unknown = [name for name in mix if not hasattr(Scenario, name)]
+    if unknown:
+        sys.exit(f"Unknown operations in mix: {', '.join(unknown)}")
+    
+    scenario = Scenario(conn)
+    conn.close()
+    handlers = load_handlers()
+    
+    result = run(handlers, scenario, mix, args.concurrency, args.requests)
+    result.update({
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'mix': mix,
+        'concurrency': args.concurrency
+    })
+    
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+    
+    results_dir = os.path.join(ROOT, 'benchmarks', 'results')
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{result['commit']}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'saved {path}')
+
+
+if __name__ == '__main__':
+    main()
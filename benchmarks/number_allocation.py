@@ -0,0 +1,97 @@
+'''
+Concurrency check for document number allocation
+Usage: BENCH_DATABASE_URL=postgresql://... python benchmarks/number_allocation.py [--workers 32] [--documents 500]
+Fires parallel registrations through the documents handler against a scratch database and
+verifies the allocated numbers are unique and contiguous.
+'''
+
+import argparse
+import concurrent.futures
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import psycopg2
+
+SCHEMA = 't_p91929212_notary_registry_syst'
+
+
+def make_token(user_id: int, email: str, role: str) -> str:
+    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
+    expiry = (datetime.utcnow() + timedelta(hours=1)).isoformat()
+    payload = f"{user_id}:{email}:{role}:{expiry}"
+    signature = hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
+    return f"{payload}:{signature}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--documents', type=int, default=500)
+    args = parser.parse_args()
+    
+    dsn = os.environ.get('BENCH_DATABASE_URL')
+    if not dsn:
+        sys.exit('BENCH_DATABASE_URL is not set')
+    os.environ['DATABASE_URL'] = dsn
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.workers)
+    
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'documents'))
+    import index  # noqa: E402
+    
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, email, role FROM {SCHEMA}.users WHERE role IN ('notary', 'admin') ORDER BY id LIMIT 1")
+    user = cur.fetchone()
+    if not user:
+        sys.exit('No notary or admin user to register documents with')
+    token = make_token(*user)
+    marker = f'ALLOC-CHECK {uuid.uuid4().hex[:8]}'
+    
+    def register(n: int) -> int:
+        event = {
+            'httpMethod': 'POST',
+            'headers': {'X-Auth-Token': token},
+            'body': json.dumps({
+                'document_type': 'Доверенность',
+                'document_date': '2024-01-15',
+                'party1_name': f'Проверка Нумерации {n}',
+                'party1_passport': '0000 000000',
+                'subject': marker
+            })
+        }
+        return index.handler(event, None)['statusCode']
+    
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+        statuses = list(executor.map(register, range(args.documents)))
+    elapsed = time.perf_counter() - started
+    
+    cur.execute(f"SELECT document_number FROM {SCHEMA}.documents WHERE subject = %s", (marker,))
+    numbers = [int(row[0].split('N-')[0]) for row in cur.fetchall()]
+    failed = len([status for status in statuses if status != 201])
+    duplicates = len(numbers) - len(set(numbers))
+    gaps = (max(numbers) - min(numbers) + 1 - len(set(numbers))) if numbers else 0
+    
+    print(f"registered {len(numbers)}/{args.documents} in {elapsed:.2f}s ({len(numbers) / elapsed:.0f} docs/s)")
+    print(f"failed requests: {failed}, duplicate numbers: {duplicates}, gaps: {gaps}")
+    
+    cur.execute(
+        f"DELETE FROM {SCHEMA}.activity_log WHERE document_id IN (SELECT id FROM {SCHEMA}.documents WHERE subject = %s)",
+        (marker,)
+    )
+    cur.execute(f"DELETE FROM {SCHEMA}.documents WHERE subject = %s", (marker,))
+    conn.commit()
+    conn.close()
+    
+    if failed or duplicates or gaps:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
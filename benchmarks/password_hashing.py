@@ -0,0 +1,55 @@
+'''
+scrypt cost benchmark for choosing PASSWORD_SCRYPT_N / PASSWORD_SCRYPT_R
+Usage: python benchmarks/password_hashing.py [--target-ms 50] [--workers 2]
+Prints latency and parallel throughput per setting and recommends the most expensive
+setting whose median verification stays under the target.
+'''
+
+import argparse
+import concurrent.futures
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'auth'))
+import passwords  # noqa: E402
+
+CANDIDATES = [(2 ** 13, 8), (2 ** 14, 8), (2 ** 15, 8), (2 ** 16, 8), (2 ** 17, 8)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target-ms', type=float, default=50)
+    parser.add_argument('--workers', type=int, default=passwords.HASH_WORKERS)
+    parser.add_argument('--repeats', type=int, default=10)
+    args = parser.parse_args()
+    
+    recommended = None
+    print(f"{'N':>8} {'r':>3} {'memory MB':>10} {'p50 ms':>8} {'logins/s':>9}")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for n, r in CANDIDATES:
+            stored = passwords.hash_password('benchmark-password', n, r, 1)
+            timings = []
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                passwords._verify('benchmark-password', stored)
+                timings.append((time.perf_counter() - started) * 1000)
+            
+            started = time.perf_counter()
+            list(executor.map(lambda _: passwords._verify('benchmark-password', stored), range(args.repeats * args.workers)))
+            throughput = args.repeats * args.workers / (time.perf_counter() - started)
+            
+            median = statistics.median(timings)
+            print(f"{n:>8} {r:>3} {128 * n * r / 2 ** 20:>10.0f} {median:>8.1f} {throughput:>9.1f}")
+            if median <= args.target_ms:
+                recommended = (n, r)
+    
+    if recommended:
+        print(f"\nrecommended: PASSWORD_SCRYPT_N={recommended[0]} PASSWORD_SCRYPT_R={recommended[1]}")
+    else:
+        print(f"\nno setting verifies within {args.target_ms} ms on this machine")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+'''
+Planning time saved by server-side prepared statements for the handlers' fixed query shapes.
+Every shape runs --iterations times as plain text and as EXECUTE of a statement prepared once
+on the same connection; planning time comes from EXPLAIN (ANALYZE, SUMMARY).
+Usage: BENCH_DATABASE_URL=postgresql://... python benchmarks/prepared_statements.py [--iterations 200]
+       [--shapes login,user,activity,listing,listing_type,document,stats,search]
+Expects a database seeded by benchmarks/load_test.py --seed.
+'''
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import psycopg2
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'documents'))
+import index as documents  # noqa: E402
+import prepared  # noqa: E402
+
+SCHEMA = 't_p91929212_notary_registry_syst'
+PLANNING_TIME = re.compile(r'Planning Time: ([\d.]+) ms')
+
+
+def listing(params: Dict[str, str]) -> str:
+    conditions, _, _, _ = documents.build_document_filters(params)
+    query = documents.document_select(documents.ALL_FIELDS, ', NULL as rank')
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    return query + ' ORDER BY d.registration_date DESC, d.id DESC LIMIT %s'
+
+
+def search() -> str:
+    condition, _, rank_expression, _ = documents.build_search('Попов')
+    return (documents.document_select(documents.ALL_FIELDS, f', {rank_expression} as rank')
+            + f' WHERE {condition} ORDER BY rank DESC, d.registration_date DESC, d.id DESC LIMIT %s')
+
+
+def shapes(cur) -> Dict[str, Tuple[str, Callable[[int], Sequence[Any]]]]:
+    cur.execute(f"SELECT id, email FROM {SCHEMA}.users WHERE email LIKE 'bench%%@example.ru' ORDER BY id")
+    users = cur.fetchall()
+    if not users:
+        sys.exit('No benchmark users, run benchmarks/load_test.py --seed first')
+    cur.execute(f'SELECT min(id), max(id) FROM {SCHEMA}.documents')
+    first_document, last_document = cur.fetchone()
+    span = last_document - first_document + 1
+
+    return {
+        'login': (
+            f'SELECT id, email, full_name, role, phone, region, password_hash FROM {SCHEMA}.users WHERE email = %s',
+            lambda i: (users[i % len(users)][1],)
+        ),
+        'user': (
+            f'SELECT id, email, full_name, role, phone, region FROM {SCHEMA}.users WHERE id = %s',
+            lambda i: (users[i % len(users)][0],)
+        ),
+        'activity': (
+            f'''SELECT al.id, al.action_type, al.action_description, al.created_at, d.document_number, al.user_id
+                FROM {SCHEMA}.activity_log al
+                LEFT JOIN {SCHEMA}.documents d ON al.document_id = d.id
+                WHERE al.user_id = %s
+                ORDER BY al.created_at DESC, al.id DESC
+                LIMIT %s''',
+            lambda i: (users[i % len(users)][0], 51)
+        ),
+        'listing': (listing({}), lambda i: (51,)),
+        'listing_type': (listing({'type': 'x'}), lambda i: ('Доверенность', 51)),
+        'document': (
+            documents.document_select(documents.ALL_FIELDS, ', d.version') + ' WHERE d.id = %s',
+            lambda i: (first_document + (i * 7919) % span,)
+        ),
+        'stats': (
+            f'SELECT document_type, status, month, count FROM {SCHEMA}.document_stats WHERE count <> 0 ORDER BY month, document_type, status',
+            lambda i: ()
+        ),
+        'search': (search(), lambda i: ['Попов'] * 4 + ['%Попов%'] * 3 + ['Попов', 51]),
+    }
+
+
+def measure(cur, statement: str, args: Callable[[int], Sequence[Any]], iterations: int) -> Tuple[float, float]:
+    '''Returns (mean planning ms, mean wall-clock ms per call)'''
+    planning: List[float] = []
+    for i in range(iterations):
+        cur.execute('EXPLAIN (ANALYZE, SUMMARY) ' + statement, args(i))
+        plan = '\n'.join(row[0] for row in cur.fetchall())
+        planning.append(float(PLANNING_TIME.search(plan).group(1)))
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        cur.execute(statement, args(i))
+        cur.fetchall()
+    elapsed = (time.perf_counter() - started) * 1000 / iterations
+
+    return statistics.mean(planning), elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--shapes', default='login,user,activity,listing,listing_type,document,stats,search')
+    args = parser.parse_args()
+
+    dsn = os.environ.get('BENCH_DATABASE_URL')
+    if not dsn:
+        sys.exit('Set BENCH_DATABASE_URL')
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    available = shapes(cur)
+    selected = args.shapes.split(',')
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        sys.exit(f"Unknown shapes: {', '.join(unknown)}")
+
+    print(f"{'shape':<14}{'plan ms':>10}{'prep plan ms':>14}{'call ms':>10}{'prep call ms':>14}{'saved':>8}")
+    for name in selected:
+        sql, make_args = available[name]
+        plain_planning, plain_call = measure(cur, sql, make_args, args.iterations)
+
+        text, count = prepared.to_server_placeholders(sql)
+        statement = prepared.statement_name(sql)
+        cur.execute(f'PREPARE {statement} AS {text}')
+        execute = f"EXECUTE {statement} ({', '.join(['%s'] * count)})" if count else f'EXECUTE {statement}'
+        prepared_planning, prepared_call = measure(cur, execute, make_args, args.iterations)
+        cur.execute(f'DEALLOCATE {statement}')
+
+        saved = (plain_call - prepared_call) / plain_call * 100 if plain_call else 0.0
+        print(f'{name:<14}{plain_planning:>10.3f}{prepared_planning:>14.3f}{plain_call:>10.3f}{prepared_call:>14.3f}{saved:>7.1f}%')
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
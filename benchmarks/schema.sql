@@ -0,0 +1,38 @@
+-- Base tables the cloud functions expect; db_migrations/ is applied on top of this
+CREATE SCHEMA IF NOT EXISTS t_p91929212_notary_registry_syst;
+
+CREATE TABLE IF NOT EXISTS t_p91929212_notary_registry_syst.users (
+    id SERIAL PRIMARY KEY,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    full_name VARCHAR(255) NOT NULL,
+    role VARCHAR(50) NOT NULL DEFAULT 'user',
+    phone VARCHAR(50),
+    region VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS t_p91929212_notary_registry_syst.documents (
+    id SERIAL PRIMARY KEY,
+    document_number VARCHAR(100) NOT NULL,
+    document_type VARCHAR(255) NOT NULL,
+    document_date DATE NOT NULL,
+    registration_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    status VARCHAR(100) NOT NULL DEFAULT 'Зарегистрирован',
+    party1_name VARCHAR(255) NOT NULL,
+    party1_passport VARCHAR(50) NOT NULL,
+    party2_name VARCHAR(255),
+    party2_passport VARCHAR(50),
+    subject TEXT NOT NULL,
+    notes TEXT,
+    created_by INTEGER REFERENCES t_p91929212_notary_registry_syst.users(id)
+);
+
+CREATE TABLE IF NOT EXISTS t_p91929212_notary_registry_syst.activity_log (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES t_p91929212_notary_registry_syst.users(id),
+    action_type VARCHAR(50) NOT NULL,
+    action_description TEXT,
+    document_id INTEGER REFERENCES t_p91929212_notary_registry_syst.documents(id),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,100 @@
+'''
+Search latency benchmark for the documents registry
+Usage: BENCH_DATABASE_URL=postgresql://... python benchmarks/search_latency.py [--sizes 10000,100000,1000000]
+Point it at a scratch database with db_migrations applied: it inserts synthetic documents
+(numbers prefixed with BENCH-) and removes them when finished.
+'''
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import List
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'documents'))
+from search import build_search  # noqa: E402
+
+SCHEMA = 't_p91929212_notary_registry_syst'
+
+SEED_SQL = f"""
+    INSERT INTO {SCHEMA}.documents
+    (document_number, document_type, document_date, status, party1_name, party1_passport,
+     party2_name, party2_passport, subject)
+    SELECT 'BENCH-' || g || 'N-0101/2024',
+           (ARRAY['Договор купли-продажи', 'Доверенность', 'Завещание', 'Договор дарения'])[1 + g %% 4],
+           DATE '2024-01-01' + (g %% 365),
+           (ARRAY['Зарегистрирован', 'В обработке'])[1 + g %% 2],
+           (ARRAY['Иванов', 'Петров', 'Сидоров', 'Кузнецов', 'Смирнов', 'Попов', 'Васильев', 'Соколов'])[1 + g %% 8]
+               || ' ' || (ARRAY['Иван', 'Пётр', 'Сергей', 'Алексей', 'Дмитрий'])[1 + g %% 5]
+               || ' ' || md5(g::text),
+           lpad((g %% 10000)::text, 4, '0') || ' ' || lpad(g::text, 6, '0'),
+           (ARRAY['Морозова', 'Волкова', 'Лебедева', 'Новикова'])[1 + g %% 4] || ' ' || md5((g * 7)::text),
+           lpad((g %% 9999)::text, 4, '0') || ' ' || lpad((g * 3)::text, 6, '0'),
+           'Synthetic benchmark document ' || g
+    FROM generate_series(%s, %s) AS g
+"""
+
+TERMS = ['BENCH-4242', 'Иванов', 'Ивановым', 'Петров Сергей', 'Волкова', 'несуществующий']
+
+
+def run_search(cur, term: str, limit: int = 50) -> None:
+    condition, condition_args, rank_expression, rank_args = build_search(term)
+    cur.execute(
+        f"SELECT d.id, {rank_expression} AS rank FROM {SCHEMA}.documents d"
+        f" WHERE {condition} ORDER BY rank DESC, d.registration_date DESC, d.id DESC LIMIT %s",
+        rank_args + condition_args + [limit]
+    )
+    cur.fetchall()
+
+
+def measure(cur, repeats: int) -> List[float]:
+    timings = []
+    for term in TERMS:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            run_search(cur, term)
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--keep', action='store_true', help='leave the synthetic rows in place')
+    args = parser.parse_args()
+    
+    dsn = os.environ.get('BENCH_DATABASE_URL')
+    if not dsn:
+        sys.exit('BENCH_DATABASE_URL is not set')
+    
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    seeded = 0
+    try:
+        print(f"{'rows':>10} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+        for size in sizes:
+            if size > seeded:
+                cur.execute(SEED_SQL, (seeded + 1, size))
+                conn.commit()
+                cur.execute(f"ANALYZE {SCHEMA}.documents")
+                conn.commit()
+                seeded = size
+            timings = measure(cur, args.repeats)
+            conn.rollback()
+            p95 = statistics.quantiles(timings, n=20, method='inclusive')[-1]
+            print(f"{size:>10} {statistics.median(timings):>8.2f} {p95:>8.2f} {max(timings):>8.2f}")
+    finally:
+        if not args.keep:
+            conn.rollback()
+            cur.execute(f"DELETE FROM {SCHEMA}.documents WHERE document_number LIKE 'BENCH-%'")
+            conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+'''
+Token verification microbenchmark: cold (signature checked every call) vs warm (cache hit)
+Usage: python benchmarks/token_verification.py [--iterations 200000] [--tokens 500]
+'''
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'auth'))
+import auth_tokens  # noqa: E402
+
+
+def run(tokens, iterations: int, clear: bool) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        if clear:
+            auth_tokens.clear_cache()
+        auth_tokens.verify_token(tokens[i % len(tokens)])
+    return iterations / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--tokens', type=int, default=500)
+    args = parser.parse_args()
+    
+    tokens = [auth_tokens.generate_token(i, f'user{i}@example.ru', 'notary') for i in range(args.tokens)]
+    cold = run(tokens, args.iterations, clear=True)
+    auth_tokens.clear_cache()
+    warm = run(tokens, args.iterations, clear=False)
+    
+    print(f"cold: {cold:>12,.0f} verifications/s")
+    print(f"warm: {warm:>12,.0f} verifications/s ({warm / cold:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
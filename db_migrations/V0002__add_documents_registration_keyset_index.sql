@@ -0,0 +1,2 @@
+CREATE INDEX IF NOT EXISTS idx_documents_registration_date_id
+ON t_p91929212_notary_registry_syst.documents (registration_date DESC, id DESC);
@@ -0,0 +1,19 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE t_p91929212_notary_registry_syst.documents
+ADD COLUMN IF NOT EXISTS party_search_vector tsvector
+GENERATED ALWAYS AS (
+    to_tsvector('russian', coalesce(party1_name, '') || ' ' || coalesce(party2_name, ''))
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_documents_party_search_vector
+ON t_p91929212_notary_registry_syst.documents USING GIN (party_search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_documents_number_trgm
+ON t_p91929212_notary_registry_syst.documents USING GIN (document_number gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_documents_party1_name_trgm
+ON t_p91929212_notary_registry_syst.documents USING GIN (party1_name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_documents_party2_name_trgm
+ON t_p91929212_notary_registry_syst.documents USING GIN (party2_name gin_trgm_ops);
@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS t_p91929212_notary_registry_syst.document_number_counters (
+    year INTEGER PRIMARY KEY,
+    last_value INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT INTO t_p91929212_notary_registry_syst.document_number_counters (year, last_value)
+SELECT EXTRACT(YEAR FROM CURRENT_DATE)::INTEGER, COUNT(*)
+FROM t_p91929212_notary_registry_syst.documents
+ON CONFLICT (year) DO NOTHING;
@@ -0,0 +1,9 @@
+CREATE INDEX IF NOT EXISTS idx_activity_log_user_created_at
+ON t_p91929212_notary_registry_syst.activity_log (user_id, created_at DESC, id DESC)
+INCLUDE (action_type, action_description, document_id);
+
+CREATE INDEX IF NOT EXISTS idx_activity_log_created_at
+ON t_p91929212_notary_registry_syst.activity_log (created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_users_region
+ON t_p91929212_notary_registry_syst.users (region);
@@ -0,0 +1,5 @@
+ALTER TABLE t_p91929212_notary_registry_syst.users
+ALTER COLUMN password_hash TYPE TEXT;
+
+COMMENT ON COLUMN t_p91929212_notary_registry_syst.users.password_hash IS
+'scrypt$N$r$p$salt$hash; legacy unsalted SHA-256 hex hashes from V0001 are upgraded on the next successful login';
@@ -0,0 +1,5 @@
+ALTER TABLE t_p91929212_notary_registry_syst.documents
+ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+CREATE INDEX IF NOT EXISTS idx_documents_document_number
+ON t_p91929212_notary_registry_syst.documents (document_number);
@@ -0,0 +1,16 @@
+CREATE TABLE IF NOT EXISTS t_p91929212_notary_registry_syst.document_stats (
+    document_type VARCHAR(255) NOT NULL,
+    status VARCHAR(100) NOT NULL,
+    month DATE NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (document_type, status, month)
+);
+
+INSERT INTO t_p91929212_notary_registry_syst.document_stats (document_type, status, month, count)
+SELECT document_type, status, date_trunc('month', registration_date)::date, COUNT(*)
+FROM t_p91929212_notary_registry_syst.documents
+GROUP BY 1, 2, 3
+ON CONFLICT (document_type, status, month) DO NOTHING;
+
+COMMENT ON TABLE t_p91929212_notary_registry_syst.document_stats IS
+    'Document counts per type, status and registration month; maintained by the documents function, rebuilt by stats reconciliation';
@@ -0,0 +1,291 @@
+-- Yearly range partitions for documents (registration_date) and activity_log (created_at).
+-- Each table gets a DEFAULT partition as a safety net, ensure_partitions() creates the
+-- upcoming years ahead of time and archive_partitions() moves closed years to *_archive.
+--
+-- Integrity: PostgreSQL only enforces uniqueness on a partitioned table per partition key,
+-- and a foreign key may only point at a partitioned table through a key that includes the
+-- partition column. So:
+--   * the primary key becomes (id, <partition column>); ids still come from one sequence;
+--   * other unique indexes are rebuilt with the partition column appended, which alone
+--     would only make e.g. (document_number, registration_date) unique; a trigger keeps
+--     the original key unique across all partitions and the archive, serialized per key
+--     value by an advisory lock;
+--   * a foreign key pointing at a converted table (activity_log.document_id) is replaced
+--     by triggers that enforce the same rule: the referencing row must find its target in
+--     the table or its archive, and a referenced row cannot be deleted;
+--   * anything that cannot be carried over this way (expression or partial unique
+--     indexes, multi-column or cascading foreign keys) aborts the migration instead of
+--     being dropped.
+
+CREATE OR REPLACE FUNCTION t_p91929212_notary_registry_syst.ensure_partitions(parent TEXT, from_date DATE, until_date DATE)
+RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    parent_table REGCLASS := format('t_p91929212_notary_registry_syst.%I', parent)::regclass;
+    default_table TEXT := format('t_p91929212_notary_registry_syst.%I', parent || '_default');
+    key_column TEXT;
+    columns TEXT;
+    bound DATE := date_trunc('year', from_date)::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    SELECT a.attname INTO key_column
+    FROM pg_partitioned_table p
+    JOIN pg_attribute a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = parent_table;
+
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO columns
+    FROM pg_attribute
+    WHERE attrelid = parent_table AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+
+    WHILE bound < until_date LOOP
+        partition_name := format('%s_%s', parent, to_char(bound, 'YYYY'));
+        IF to_regclass(format('t_p91929212_notary_registry_syst.%I', partition_name)) IS NULL THEN
+            -- Rows of that year may already sit in the default partition: detach it, create the
+            -- year, move the rows over and re-attach, since a new partition may not overlap them
+            EXECUTE format('ALTER TABLE %s DETACH PARTITION %s', parent_table, default_table);
+            EXECUTE format(
+                'CREATE TABLE t_p91929212_notary_registry_syst.%I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent_table, bound, (bound + interval '1 year')::date
+            );
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM %s WHERE %I >= %L AND %I < %L RETURNING %s) INSERT INTO %s (%s) SELECT %s FROM moved',
+                default_table, key_column, bound, key_column, (bound + interval '1 year')::date,
+                columns, parent_table, columns, columns
+            );
+            EXECUTE format('ALTER TABLE %s ATTACH PARTITION %s DEFAULT', parent_table, default_table);
+            created := created + 1;
+        END IF;
+        bound := (bound + interval '1 year')::date;
+    END LOOP;
+    RETURN created;
+END $$;
+
+CREATE OR REPLACE FUNCTION t_p91929212_notary_registry_syst.archive_partitions(parent TEXT, before DATE, archive_tablespace TEXT DEFAULT NULL)
+RETURNS INTEGER LANGUAGE plpgsql AS $$
+DECLARE
+    parent_table REGCLASS := format('t_p91929212_notary_registry_syst.%I', parent)::regclass;
+    archive_table REGCLASS := format('t_p91929212_notary_registry_syst.%I', parent || '_archive')::regclass;
+    part RECORD;
+    index_name REGCLASS;
+    archived INTEGER := 0;
+BEGIN
+    FOR part IN
+        SELECT c.oid::regclass AS partition_table, pg_get_expr(c.relpartbound, c.oid) AS bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = parent_table
+          AND pg_get_expr(c.relpartbound, c.oid) <> 'DEFAULT'
+          AND substring(pg_get_expr(c.relpartbound, c.oid) FROM 'TO \(''([^'']+)''\)')::timestamp <= before
+        ORDER BY 1
+    LOOP
+        EXECUTE format('ALTER TABLE %s DETACH PARTITION %s', parent_table, part.partition_table);
+        EXECUTE format('ALTER TABLE %s ATTACH PARTITION %s %s', archive_table, part.partition_table, part.bound);
+        IF archive_tablespace IS NOT NULL THEN
+            EXECUTE format('ALTER TABLE %s SET TABLESPACE %I', part.partition_table, archive_tablespace);
+            FOR index_name IN SELECT indexrelid::regclass FROM pg_index WHERE indrelid = part.partition_table LOOP
+                EXECUTE format('ALTER INDEX %s SET TABLESPACE %I', index_name, archive_tablespace);
+            END LOOP;
+        END IF;
+        archived := archived + 1;
+    END LOOP;
+    RETURN archived;
+END $$;
+
+-- TG_ARGV: the partitioned table, then the columns of the unique key it cannot enforce itself
+CREATE OR REPLACE FUNCTION t_p91929212_notary_registry_syst.enforce_partitioned_unique()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    key_columns TEXT[] := TG_ARGV[1:];
+    missing BOOLEAN;
+    taken BOOLEAN;
+    conditions TEXT;
+BEGIN
+    -- As in a unique index, keys with a NULL never collide
+    EXECUTE 'SELECT ' || (SELECT string_agg(format('($1).%I IS NULL', col), ' OR ') FROM unnest(key_columns) col)
+        INTO missing USING NEW;
+    IF missing THEN
+        RETURN NEW;
+    END IF;
+    EXECUTE format(
+        'SELECT pg_advisory_xact_lock(hashtext(%L || row(%s)::text))',
+        TG_ARGV[0], (SELECT string_agg(format('($1).%I', col), ', ') FROM unnest(key_columns) col)
+    ) USING NEW;
+    SELECT string_agg(format('%I = ($1).%I', col, col), ' AND ') INTO conditions FROM unnest(key_columns) col;
+    EXECUTE format(
+        'SELECT EXISTS (SELECT 1 FROM t_p91929212_notary_registry_syst.%I WHERE %s AND id <> ($1).id)'
+        ' OR EXISTS (SELECT 1 FROM t_p91929212_notary_registry_syst.%I WHERE %s AND id <> ($1).id)',
+        TG_ARGV[0], conditions, TG_ARGV[0] || '_archive', conditions
+    ) INTO taken USING NEW;
+    IF taken THEN
+        RAISE EXCEPTION 'duplicate key value violates unique key (%) of "%"', array_to_string(key_columns, ', '), TG_ARGV[0]
+            USING ERRCODE = 'unique_violation';
+    END IF;
+    RETURN NEW;
+END $$;
+
+-- TG_ARGV: referencing column, referenced table, referenced column
+CREATE OR REPLACE FUNCTION t_p91929212_notary_registry_syst.check_partitioned_reference()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    missing BOOLEAN;
+    found BOOLEAN;
+BEGIN
+    EXECUTE format('SELECT ($1).%I IS NULL', TG_ARGV[0]) INTO missing USING NEW;
+    IF missing THEN
+        RETURN NEW;
+    END IF;
+    EXECUTE format(
+        'SELECT EXISTS (SELECT 1 FROM t_p91929212_notary_registry_syst.%I WHERE %I = ($1).%I)'
+        ' OR EXISTS (SELECT 1 FROM t_p91929212_notary_registry_syst.%I WHERE %I = ($1).%I)',
+        TG_ARGV[1], TG_ARGV[2], TG_ARGV[0], TG_ARGV[1] || '_archive', TG_ARGV[2], TG_ARGV[0]
+    ) INTO found USING NEW;
+    IF NOT found THEN
+        RAISE EXCEPTION 'insert or update on table "%" violates reference to "%"', TG_TABLE_NAME, TG_ARGV[1]
+            USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NEW;
+END $$;
+
+-- TG_ARGV: referencing table, referencing column, referenced column
+CREATE OR REPLACE FUNCTION t_p91929212_notary_registry_syst.restrict_partitioned_reference()
+RETURNS TRIGGER LANGUAGE plpgsql AS $$
+DECLARE
+    referenced BOOLEAN;
+BEGIN
+    EXECUTE format(
+        'SELECT EXISTS (SELECT 1 FROM t_p91929212_notary_registry_syst.%I WHERE %I = ($1).%I)',
+        TG_ARGV[0], TG_ARGV[1], TG_ARGV[2]
+    ) INTO referenced USING OLD;
+    IF referenced THEN
+        RAISE EXCEPTION 'delete on table "%" violates reference from "%"', TG_TABLE_NAME, TG_ARGV[0]
+            USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN OLD;
+END $$;
+
+CREATE OR REPLACE FUNCTION t_p91929212_notary_registry_syst.partition_by_year(parent TEXT, key_column TEXT)
+RETURNS VOID LANGUAGE plpgsql AS $$
+DECLARE
+    old_table REGCLASS := format('t_p91929212_notary_registry_syst.%I', parent)::regclass;
+    index_definitions TEXT[];
+    unique_key RECORD;
+    trigger_definitions TEXT[];
+    foreign_keys TEXT[];
+    definition TEXT;
+    reference RECORD;
+    id_sequence TEXT;
+    columns TEXT;
+    first_date DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = old_table) = 'p' THEN
+        RETURN;
+    END IF;
+
+    -- The primary key is recreated below as (id, key_column) and other unique indexes with
+    -- key_column appended; every other index and every trigger is replayed as it was
+    IF EXISTS (
+        SELECT 1 FROM pg_index
+        WHERE indrelid = old_table AND indisunique AND NOT indisprimary
+          AND (indexprs IS NOT NULL OR indpred IS NOT NULL)
+    ) THEN
+        RAISE EXCEPTION 'cannot keep an expression or partial unique index of % when partitioning', old_table;
+    END IF;
+    SELECT array_agg(pg_get_indexdef(indexrelid)) INTO index_definitions
+    FROM pg_index WHERE indrelid = old_table AND NOT indisunique;
+    SELECT array_agg(pg_get_triggerdef(oid)) INTO trigger_definitions
+    FROM pg_trigger WHERE tgrelid = old_table AND NOT tgisinternal;
+    FOR unique_key IN
+        SELECT c.relname AS index_name,
+               string_agg(quote_ident(a.attname), ', ' ORDER BY k.position) AS columns,
+               string_agg(quote_ident(a.attname), ', ' ORDER BY k.position) FILTER (WHERE a.attname <> key_column) AS other_columns,
+               string_agg(quote_literal(a.attname), ', ' ORDER BY k.position) AS arguments
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS k (attnum, position)
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+        WHERE i.indrelid = old_table AND i.indisunique AND NOT i.indisprimary
+        GROUP BY c.relname
+    LOOP
+        index_definitions := index_definitions || format(
+            'ALTER TABLE t_p91929212_notary_registry_syst.%I ADD UNIQUE (%s)',
+            parent, concat_ws(', ', unique_key.other_columns, quote_ident(key_column))
+        );
+        trigger_definitions := trigger_definitions || format(
+            'CREATE TRIGGER %I BEFORE INSERT OR UPDATE OF %s ON t_p91929212_notary_registry_syst.%I FOR EACH ROW'
+            ' EXECUTE FUNCTION t_p91929212_notary_registry_syst.enforce_partitioned_unique(%L, %s)',
+            unique_key.index_name || '_unique', unique_key.columns, parent, parent, unique_key.arguments
+        );
+    END LOOP;
+    SELECT array_agg(pg_get_constraintdef(oid)) INTO foreign_keys
+    FROM pg_constraint WHERE conrelid = old_table AND contype = 'f';
+    SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO columns
+    FROM pg_attribute WHERE attrelid = old_table AND attnum > 0 AND NOT attisdropped AND attgenerated = '';
+    id_sequence := pg_get_serial_sequence(old_table::text, 'id');
+
+    -- Foreign keys pointing at the table would need the partition key in the referenced key;
+    -- each becomes a pair of triggers (see the header), created once the new table exists
+    FOR reference IN
+        SELECT c.conrelid::regclass AS tbl, c.conname, c.confdeltype, c.confupdtype,
+               array_length(c.conkey, 1) AS width, a.attname AS from_column, fa.attname AS to_column
+        FROM pg_constraint c
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+        JOIN pg_attribute fa ON fa.attrelid = c.confrelid AND fa.attnum = c.confkey[1]
+        WHERE c.confrelid = old_table AND c.contype = 'f'
+    LOOP
+        IF reference.width <> 1 OR reference.confdeltype NOT IN ('a', 'r') OR reference.confupdtype NOT IN ('a', 'r') THEN
+            RAISE EXCEPTION 'cannot replace foreign key % on % with triggers', reference.conname, reference.tbl;
+        END IF;
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', reference.tbl, reference.conname);
+        EXECUTE format(
+            'CREATE TRIGGER %I BEFORE INSERT OR UPDATE OF %I ON %s FOR EACH ROW'
+            ' EXECUTE FUNCTION t_p91929212_notary_registry_syst.check_partitioned_reference(%L, %L, %L)',
+            reference.conname, reference.from_column, reference.tbl, reference.from_column, parent, reference.to_column
+        );
+        trigger_definitions := trigger_definitions || format(
+            'CREATE TRIGGER %I BEFORE DELETE ON t_p91929212_notary_registry_syst.%I FOR EACH ROW'
+            ' EXECUTE FUNCTION t_p91929212_notary_registry_syst.restrict_partitioned_reference(%L, %L, %L)',
+            reference.conname || '_restrict', parent, (SELECT relname FROM pg_class WHERE oid = reference.tbl),
+            reference.from_column, reference.to_column
+        );
+    END LOOP;
+
+    EXECUTE format('ALTER TABLE %s RENAME TO %I', old_table, parent || '_unpartitioned');
+    EXECUTE format(
+        'CREATE TABLE t_p91929212_notary_registry_syst.%I (LIKE %s INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS INCLUDING COMMENTS) PARTITION BY RANGE (%I)',
+        parent, old_table, key_column
+    );
+    EXECUTE format('CREATE TABLE t_p91929212_notary_registry_syst.%I PARTITION OF t_p91929212_notary_registry_syst.%I DEFAULT', parent || '_default', parent);
+
+    EXECUTE format('SELECT min(%I)::date FROM %s', key_column, old_table) INTO first_date;
+    PERFORM t_p91929212_notary_registry_syst.ensure_partitions(
+        parent, coalesce(first_date, CURRENT_DATE), (date_trunc('year', CURRENT_DATE) + interval '3 years')::date
+    );
+
+    EXECUTE format('INSERT INTO t_p91929212_notary_registry_syst.%I (%s) SELECT %s FROM %s', parent, columns, columns, old_table);
+    IF id_sequence IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY t_p91929212_notary_registry_syst.%I.id', id_sequence, parent);
+    END IF;
+    EXECUTE format('DROP TABLE %s', old_table);
+
+    EXECUTE format('ALTER TABLE t_p91929212_notary_registry_syst.%I ADD PRIMARY KEY (id, %I)', parent, key_column);
+    FOREACH definition IN ARRAY coalesce(index_definitions, '{}') LOOP
+        EXECUTE definition;
+    END LOOP;
+    FOREACH definition IN ARRAY coalesce(trigger_definitions, '{}') LOOP
+        EXECUTE definition;
+    END LOOP;
+    FOREACH definition IN ARRAY coalesce(foreign_keys, '{}') LOOP
+        EXECUTE format('ALTER TABLE t_p91929212_notary_registry_syst.%I ADD %s', parent, definition);
+    END LOOP;
+
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS t_p91929212_notary_registry_syst.%I (LIKE t_p91929212_notary_registry_syst.%I INCLUDING DEFAULTS INCLUDING GENERATED) PARTITION BY RANGE (%I)',
+        parent || '_archive', parent, key_column
+    );
+    EXECUTE format('ANALYZE t_p91929212_notary_registry_syst.%I', parent);
+END $$;
+
+SELECT t_p91929212_notary_registry_syst.partition_by_year('documents', 'registration_date');
+SELECT t_p91929212_notary_registry_syst.partition_by_year('activity_log', 'created_at');
+
+DROP FUNCTION t_p91929212_notary_registry_syst.partition_by_year(TEXT, TEXT);
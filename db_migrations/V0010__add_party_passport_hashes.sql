@@ -0,0 +1,27 @@
+-- Keyed hashes of the party passports (see backend/documents/passports.py). The HMAC key is a
+-- function secret, so existing rows are filled in batches by POST /documents?passports=backfill
+-- rather than here. Both registry tables get the columns: archived partitions are re-attached
+-- to documents_archive and must keep the same column set.
+ALTER TABLE t_p91929212_notary_registry_syst.documents
+ADD COLUMN IF NOT EXISTS party1_passport_hash BYTEA,
+ADD COLUMN IF NOT EXISTS party2_passport_hash BYTEA;
+
+ALTER TABLE t_p91929212_notary_registry_syst.documents_archive
+ADD COLUMN IF NOT EXISTS party1_passport_hash BYTEA,
+ADD COLUMN IF NOT EXISTS party2_passport_hash BYTEA;
+
+CREATE INDEX IF NOT EXISTS idx_documents_party1_passport_hash
+ON t_p91929212_notary_registry_syst.documents (party1_passport_hash, registration_date DESC, id DESC)
+WHERE party1_passport_hash IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_documents_party2_passport_hash
+ON t_p91929212_notary_registry_syst.documents (party2_passport_hash, registration_date DESC, id DESC)
+WHERE party2_passport_hash IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_documents_archive_party1_passport_hash
+ON t_p91929212_notary_registry_syst.documents_archive (party1_passport_hash, registration_date DESC, id DESC)
+WHERE party1_passport_hash IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_documents_archive_party2_passport_hash
+ON t_p91929212_notary_registry_syst.documents_archive (party2_passport_hash, registration_date DESC, id DESC)
+WHERE party2_passport_hash IS NOT NULL;
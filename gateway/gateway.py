@@ -0,0 +1,329 @@
+'''
+Self-hosted gateway: serves every function from backend/func2url.json in one long-lived
+process tree, at /<function> (e.g. /documents?limit=10), by turning each HTTP request into
+the platform's handler(event, context) call. The cloud deployments are unaffected.
+
+Usage: DATABASE_URL=postgresql://... python gateway/gateway.py [--host 0.0.0.0] [--port 8000]
+           [--workers <cpu count>] [--threads 16] [--shutdown-timeout 30] [--access-log]
+
+Each worker process imports the functions itself after the fork, so connection pools, the
+token cache and the result cache live per process and are shared by all its requests.
+Requests run on a fixed thread pool. Every function keeps its own connection pool, so
+DB_POOL_MAX_SIZE defaults to the thread count split between the functions (at least 1):
+a worker then opens about --threads connections per database, not --threads per function.
+Activity events are written by the background flusher instead of at the end of a request.
+A paged export (a response with X-Next-Cursor to a request without ?after=) is followed
+page by page and sent as one chunked response, so the client gets the whole file while
+the gateway only ever holds one page; gzip pages are re-encoded as a single gzip stream.
+SIGTERM or SIGINT stops accepting, lets queued and running requests finish (up to
+--shutdown-timeout), flushes pending activity events and closes the pools.
+'''
+
+import argparse
+import base64
+import concurrent.futures
+import glob
+import http.server
+import importlib.util
+import json
+import os
+import signal
+import sys
+import threading
+import traceback
+import uuid
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Set
+from urllib.parse import parse_qsl, urlsplit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+
+class Context:
+    def __init__(self, function_name: str):
+        self.request_id = uuid.uuid4().hex
+        self.function_name = function_name
+
+
+class Function:
+    '''One deployed function: its handler plus the sibling modules imported alongside it'''
+    def __init__(self, name: str, handler: Callable[[Dict[str, Any], Any], Dict[str, Any]], modules: Dict[str, Any]):
+        self.name = name
+        self.handler = handler
+        self.modules = modules
+
+    def start(self) -> None:
+        activity_log, db = self.modules.get('activity_log'), self.modules.get('db')
+        if activity_log and db and os.environ.get('DATABASE_URL'):
+            activity_log.start_background_flusher(lambda: db.acquire_connection(os.environ['DATABASE_URL']), db.release_connection)
+
+    def stop(self) -> None:
+        activity_log, db = self.modules.get('activity_log'), self.modules.get('db')
+        if activity_log and db and os.environ.get('DATABASE_URL'):
+            activity_log.stop_background_flusher(lambda: db.acquire_connection(os.environ['DATABASE_URL']), db.release_connection)
+        if db:
+            db.close_pool()
+
+
+def function_names(root: str = ROOT) -> List[str]:
+    with open(os.path.join(root, 'backend', 'func2url.json')) as f:
+        return list(json.load(f))
+
+
+def load_functions(root: str = ROOT) -> Dict[str, Function]:
+    '''Import every function's index.py with its own sibling modules, as each is deployed separately'''
+    functions = {}
+    for name in function_names(root):
+        directory = os.path.join(root, 'backend', name)
+        siblings = [os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(directory, '*.py'))]
+        saved = {sibling: sys.modules.pop(sibling) for sibling in siblings if sibling in sys.modules}
+        sys.path.insert(0, directory)
+        try:
+            spec = importlib.util.spec_from_file_location(f'gateway_{name}_index', os.path.join(directory, 'index.py'))
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            modules = {sibling: sys.modules[sibling] for sibling in siblings if sibling in sys.modules}
+            functions[name] = Function(name, module.handler, modules)
+        finally:
+            sys.path.remove(directory)
+            for sibling in siblings:
+                sys.modules.pop(sibling, None)
+            sys.modules.update(saved)
+    return functions
+
+
+def canonical_header(name: str) -> str:
+    # The platform delivers header names as X-Auth-Token, Content-Type, If-None-Match
+    return '-'.join(part.capitalize() for part in name.split('-'))
+
+
+def to_event(method: str, target: str, headers: Dict[str, str], body: bytes, client_ip: str) -> tuple:
+    '''Returns (function name, event) for a request line target such as /documents/?limit=10'''
+    url = urlsplit(target)
+    name, _, path = url.path.lstrip('/').partition('/')
+    try:
+        text_body, is_base64 = body.decode('utf-8'), False
+    except UnicodeDecodeError:
+        text_body, is_base64 = base64.b64encode(body).decode(), True
+
+    return name, {
+        'httpMethod': method,
+        'path': '/' + path,
+        'url': target,
+        'headers': {canonical_header(key): value for key, value in headers.items()},
+        'queryStringParameters': dict(parse_qsl(url.query, keep_blank_values=True)),
+        'body': text_body,
+        'isBase64Encoded': is_base64,
+        'requestContext': {
+            'requestId': uuid.uuid4().hex,
+            'httpMethod': method,
+            'identity': {'sourceIp': client_ip}
+        }
+    }
+
+
+class GatewayRequestHandler(http.server.BaseHTTPRequestHandler):
+    server_version = 'RegistryGateway/1.0'
+    protocol_version = 'HTTP/1.1'
+    timeout = 30
+
+    def dispatch(self) -> None:
+        if self.path == '/healthz':
+            self.respond({'statusCode': 503 if self.server.draining else 200, 'headers': {}, 'body': ''})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_SIZE:
+            self.respond(error_response(413, 'Request body too large'))
+            return
+        body = self.rfile.read(length) if length else b''
+
+        name, event = to_event(self.command, self.path, dict(self.headers.items()), body, self.client_address[0])
+        function = self.server.functions.get(name)
+        if function is None:
+            self.respond(error_response(404, f'Unknown function: {name}'))
+            return
+
+        try:
+            response = function.handler(event, Context(name))
+        except Exception as e:
+            response = error_response(500, f'Server error: {str(e)}')
+        if response.get('statusCode') == 200 and (response.get('headers') or {}).get('X-Next-Cursor') \
+                and 'after' not in event['queryStringParameters']:
+            self.stream_pages(function, event, response)
+            return
+        self.respond(response)
+
+    def respond(self, response: Dict[str, Any]) -> None:
+        payload = response_payload(response)
+        self.send_response(response.get('statusCode', 200))
+        for key, value in (response.get('headers') or {}).items():
+            self.send_header(key, str(value))
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def stream_pages(self, function: Function, event: Dict[str, Any], response: Dict[str, Any]) -> None:
+        '''Sends the first page and every page after it, following X-Next-Cursor, as chunks'''
+        self.send_response(200)
+        for key, value in response['headers'].items():
+            if key not in ('X-Next-Cursor', 'Access-Control-Expose-Headers'):
+                self.send_header(key, str(value))
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        # Each gzip page is a complete gzip member, and most clients stop after the first
+        compressor = zlib.compressobj(wbits=31) if response['headers'].get('Content-Encoding') == 'gzip' else None
+        while True:
+            payload = response_payload(response)
+            if compressor:
+                payload = compressor.compress(zlib.decompress(payload, wbits=31))
+            if payload:
+                self.wfile.write(f'{len(payload):X}\r\n'.encode() + payload + b'\r\n')
+            cursor = response['headers'].get('X-Next-Cursor')
+            if not cursor:
+                break
+            query = dict(event['queryStringParameters'], after=cursor)
+            event = dict(event, queryStringParameters=query)
+            try:
+                response = function.handler(event, Context(function.name))
+            except Exception as e:
+                response = error_response(500, f'Server error: {str(e)}')
+            if response.get('statusCode') != 200:
+                # The status line is gone; closing without the last chunk marks the body incomplete
+                return
+        tail = compressor.flush() if compressor else b''
+        if tail:
+            self.wfile.write(f'{len(tail):X}\r\n'.encode() + tail + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = dispatch
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+
+def response_payload(response: Dict[str, Any]) -> bytes:
+    body = response.get('body') or ''
+    return base64.b64decode(body) if response.get('isBase64Encoded') else body.encode()
+
+
+def error_response(status_code: int, message: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps({'error': message})
+    }
+
+
+class GatewayServer(http.server.HTTPServer):
+    '''HTTP server that hands accepted connections to a fixed-size thread pool'''
+    daemon_threads = True
+    functions: Dict[str, Function] = {}
+    executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    access_log = False
+    draining = False
+
+    def process_request(self, request, client_address) -> None:
+        request.setblocking(True)
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address) -> None:
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def run_worker(server: GatewayServer, args: argparse.Namespace) -> None:
+    '''Serve until SIGTERM/SIGINT, then drain in-flight requests and release resources'''
+    server.functions = load_functions()
+    server.executor = concurrent.futures.ThreadPoolExecutor(max_workers=args.threads, thread_name_prefix='gateway')
+    server.access_log = args.access_log
+    for function in server.functions.values():
+        function.start()
+
+    def stop(signum, frame) -> None:
+        server.draining = True
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        server.serve_forever()
+    finally:
+        drained = threading.Thread(target=server.executor.shutdown, kwargs={'wait': True}, daemon=True)
+        drained.start()
+        drained.join(args.shutdown_timeout)
+        for function in server.functions.values():
+            function.stop()
+        server.server_close()
+
+
+def spawn(server: GatewayServer, args: argparse.Namespace) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(server, args)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--shutdown-timeout', type=float, default=30)
+    parser.add_argument('--access-log', action='store_true')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(max(1, args.threads // len(function_names()))))
+    server = GatewayServer((args.host, args.port), GatewayRequestHandler)
+    print(f'gateway listening on {args.host}:{args.port} with {args.workers} worker(s) x {args.threads} threads, '
+          f'DB_POOL_MAX_SIZE={os.environ["DB_POOL_MAX_SIZE"]} per function', flush=True)
+
+    if args.workers <= 1 or not hasattr(os, 'fork'):
+        run_worker(server, args)
+        return
+
+    # Workers share the listening socket; a non-blocking accept lets the losers of a
+    # wake-up return to their loop instead of blocking inside accept()
+    server.socket.setblocking(False)
+    children: Set[int] = {spawn(server, args) for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            children.add(spawn(server, args))
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,33 @@
-const API_URLS = {
-  auth: 'https://functions.poehali.dev/a6f1aabb-03be-4acd-a418-b2b5854d34d8',
-  documents: 'https://functions.poehali.dev/ef8886b1-577a-463b-bf2f-76784d95602b',
-  activity: 'https://functions.poehali.dev/48474da9-402f-47ba-bbbd-75ff8c867798'
-};
+// Self-hosted deployments point this at gateway/gateway.py, which serves /auth, /documents, /activity
+const GATEWAY_URL: string | undefined = import.meta.env.VITE_API_GATEWAY_URL;
+
+const API_URLS = GATEWAY_URL
+  ? {
+      auth: `${GATEWAY_URL}/auth`,
+      documents: `${GATEWAY_URL}/documents`,
+      activity: `${GATEWAY_URL}/activity`
+    }
+  : {
+      auth: 'https://functions.poehali.dev/a6f1aabb-03be-4acd-a418-b2b5854d34d8',
+      documents: 'https://functions.poehali.dev/ef8886b1-577a-463b-bf2f-76784d95602b',
+      activity: 'https://functions.poehali.dev/48474da9-402f-47ba-bbbd-75ff8c867798'
+    };
+
+// Writes answer with X-Primary-Until; sending it back keeps this client's reads on the
+// primary database until then, so a lagging read replica cannot hide its own changes
+let primaryUntil: string | null = null;
+
+function rememberPrimaryUntil(response: Response): void {
+  const until = response.headers.get('X-Primary-Until');
+  if (until) primaryUntil = until;
+}
+
+function readHeaders(headers: Record<string, string> = {}): Record<string, string> {
+  if (primaryUntil && Number(primaryUntil) > Date.now() / 1000) {
+    return { ...headers, 'X-Primary-Until': primaryUntil };
+  }
+  return headers;
+}
 
 export interface User {
   id: number;
@@ -27,6 +52,7 @@ export interface Document {
   subject: string;
   notes?: string;
   created_by_name?: string;
+  version?: number;
 }
 
 export interface Activity {
@@ -35,6 +61,7 @@ export interface Activity {
   description: string;
   created_at: string;
   document_number?: string;
+  user_id?: number;
 }
 
 export const auth = {
@@ -56,7 +83,7 @@ export const auth = {
   async getUser(token: string): Promise<User> {
     const response = await fetch(API_URLS.auth, {
       method: 'GET',
-      headers: { 'X-Auth-Token': token }
+      headers: readHeaders({ 'X-Auth-Token': token })
     });
     
     if (!response.ok) {
@@ -68,22 +95,99 @@ export const auth = {
   }
 };
 
+export interface DocumentPage {
+  documents: Document[];
+  next_cursor: string | null;
+  total_estimate?: number;
+}
+
+export interface DocumentQuery {
+  search?: string;
+  type?: string;
+  status?: string;
+  limit?: number;
+  after?: string;
+  include_total?: boolean;
+  archive?: boolean;
+  fields?: (keyof Document)[];
+}
+
+export interface BatchRegistrationResult {
+  success: boolean;
+  registered: number;
+  failed: number;
+  results: {
+    index: number;
+    success: boolean;
+    error?: string;
+    document?: { id: number; number: string; registration_date: string };
+  }[];
+}
+
+export interface DocumentChange {
+  status?: string;
+  notes?: string;
+}
+
+export interface DocumentChangeResult {
+  success: boolean;
+  document: { id: number; number: string; status: string; version: number };
+}
+
+export interface RegistryStats {
+  total: number;
+  by_type: Record<string, number>;
+  by_status: Record<string, number>;
+  by_month: Record<string, number>;
+  buckets: { type: string; status: string; month: string; count: number }[];
+}
+
+export class DocumentConflictError extends Error {
+  currentVersion: number;
+
+  constructor(message: string, currentVersion: number) {
+    super(message);
+    this.currentVersion = currentVersion;
+  }
+}
+
+async function parseChangeResponse(response: Response, fallback: string): Promise<DocumentChangeResult> {
+  rememberPrimaryUntil(response);
+  const data = await response.json();
+  if (response.status === 409) {
+    throw new DocumentConflictError(data.error, data.current_version);
+  }
+  if (!response.ok) {
+    throw new Error(data.error || fallback);
+  }
+  return data;
+}
+
 export const documents = {
-  async getAll(params?: { search?: string; type?: string; status?: string }): Promise<Document[]> {
+  async getPage(params?: DocumentQuery): Promise<DocumentPage> {
     const queryParams = new URLSearchParams();
     if (params?.search) queryParams.append('search', params.search);
     if (params?.type) queryParams.append('type', params.type);
     if (params?.status) queryParams.append('status', params.status);
+    if (params?.limit) queryParams.append('limit', String(params.limit));
+    if (params?.after) queryParams.append('after', params.after);
+    if (params?.include_total) queryParams.append('include_total', '1');
+    if (params?.archive) queryParams.append('archive', '1');
+    if (params?.fields?.length) queryParams.append('fields', params.fields.join(','));
     
     const url = `${API_URLS.documents}${queryParams.toString() ? '?' + queryParams.toString() : ''}`;
-    const response = await fetch(url);
+    const response = await fetch(url, { headers: readHeaders() });
     
     if (!response.ok) {
       throw new Error('Failed to fetch documents');
     }
     
-    const data = await response.json();
-    return data.documents;
+    return response.json();
+  },
+
+  async getAll(params?: DocumentQuery): Promise<Document[]> {
+    const page = await documents.getPage(params);
+    return page.documents;
   },
 
   async create(token: string, documentData: any): Promise<{ success: boolean; document: any }> {
@@ -95,6 +199,7 @@ export const documents = {
       },
       body: JSON.stringify(documentData)
     });
+    rememberPrimaryUntil(response);
     
     if (!response.ok) {
       const error = await response.json();
@@ -102,21 +207,147 @@ export const documents = {
     }
     
     return response.json();
+  },
+
+  async createBatch(token: string, documentsData: any[]): Promise<BatchRegistrationResult> {
+    const response = await fetch(API_URLS.documents, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-Auth-Token': token
+      },
+      body: JSON.stringify(documentsData)
+    });
+    rememberPrimaryUntil(response);
+    
+    const data = await response.json();
+    if (!response.ok && !data.results) {
+      throw new Error(data.error || 'Failed to register documents');
+    }
+    
+    return data;
+  },
+
+  async getStats(): Promise<RegistryStats> {
+    const response = await fetch(`${API_URLS.documents}?stats=1`, { headers: readHeaders() });
+    
+    if (!response.ok) {
+      throw new Error('Failed to fetch statistics');
+    }
+    
+    return response.json();
+  },
+
+  async getById(id: number): Promise<Document> {
+    const response = await fetch(`${API_URLS.documents}?id=${id}`, { headers: readHeaders() });
+    
+    if (!response.ok) {
+      throw new Error('Failed to fetch document');
+    }
+    
+    const data = await response.json();
+    return data.document;
+  },
+
+  async getByNumber(number: string): Promise<Document> {
+    const response = await fetch(`${API_URLS.documents}?number=${encodeURIComponent(number)}`, { headers: readHeaders() });
+    
+    if (!response.ok) {
+      throw new Error('Failed to fetch document');
+    }
+    
+    const data = await response.json();
+    return data.document;
+  },
+
+  async getPartyHistory(token: string, passport: string, params?: { limit?: number; after?: string; archive?: boolean }): Promise<DocumentPage> {
+    const queryParams = new URLSearchParams({ history: 'passport' });
+    if (params?.limit) queryParams.append('limit', String(params.limit));
+    if (params?.after) queryParams.append('after', params.after);
+    if (params?.archive) queryParams.append('archive', '1');
+    
+    // The passport goes in the body so it never appears in URLs or access logs
+    const response = await fetch(`${API_URLS.documents}?${queryParams.toString()}`, {
+      method: 'POST',
+      headers: readHeaders({
+        'Content-Type': 'application/json',
+        'X-Auth-Token': token
+      }),
+      body: JSON.stringify({ passport })
+    });
+    
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.error || 'Failed to fetch party history');
+    }
+    
+    return response.json();
+  },
+
+  async update(token: string, id: number, version: number, changes: DocumentChange): Promise<DocumentChangeResult> {
+    const response = await fetch(API_URLS.documents, {
+      method: 'PUT',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-Auth-Token': token
+      },
+      body: JSON.stringify({ id, version, ...changes })
+    });
+    
+    return parseChangeResponse(response, 'Failed to update document');
+  },
+
+  async annul(token: string, id: number, version: number): Promise<DocumentChangeResult> {
+    const response = await fetch(`${API_URLS.documents}?id=${id}&version=${version}`, {
+      method: 'DELETE',
+      headers: { 'X-Auth-Token': token }
+    });
+    
+    return parseChangeResponse(response, 'Failed to annul document');
   }
 };
 
+export interface ActivityPage {
+  activities: Activity[];
+  next_cursor: string | null;
+}
+
+export interface ActivityQuery {
+  action_type?: string;
+  from?: string;
+  to?: string;
+  region?: string;
+  limit?: number;
+  before?: string;
+  archive?: boolean;
+}
+
 export const activity = {
-  async getHistory(token: string): Promise<Activity[]> {
-    const response = await fetch(API_URLS.activity, {
+  async getPage(token: string, params?: ActivityQuery): Promise<ActivityPage> {
+    const queryParams = new URLSearchParams();
+    if (params?.action_type) queryParams.append('action_type', params.action_type);
+    if (params?.from) queryParams.append('from', params.from);
+    if (params?.to) queryParams.append('to', params.to);
+    if (params?.region) queryParams.append('region', params.region);
+    if (params?.limit) queryParams.append('limit', String(params.limit));
+    if (params?.before) queryParams.append('before', params.before);
+    if (params?.archive) queryParams.append('archive', '1');
+    
+    const url = `${API_URLS.activity}${queryParams.toString() ? '?' + queryParams.toString() : ''}`;
+    const response = await fetch(url, {
       method: 'GET',
-      headers: { 'X-Auth-Token': token }
+      headers: readHeaders({ 'X-Auth-Token': token })
     });
     
     if (!response.ok) {
       throw new Error('Failed to fetch activity');
     }
     
-    const data = await response.json();
-    return data.activities;
+    return response.json();
+  },
+
+  async getHistory(token: string, params?: ActivityQuery): Promise<Activity[]> {
+    const page = await activity.getPage(token, params);
+    return page.activities;
   }
 };
@@ -11,7 +11,7 @@ import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle, Di
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
 import { Textarea } from '@/components/ui/textarea';
 import { useAuth } from '@/contexts/AuthContext';
-import { documents, activity, Document, Activity } from '@/lib/api';
+import { documents, activity, Document, DocumentQuery, Activity, RegistryStats } from '@/lib/api';
 import { toast } from 'sonner';
 
 const Index = () => {
@@ -26,6 +26,10 @@ const Index = () => {
   // Documents state
   const [allDocuments, setAllDocuments] = useState<Document[]>([]);
   const [isLoadingDocuments, setIsLoadingDocuments] = useState(false);
+  const [documentsQuery, setDocumentsQuery] = useState<DocumentQuery>({});
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  const [registryStats, setRegistryStats] = useState<RegistryStats | null>(null);
   
   // Activity log state
   const [activityLog, setActivityLog] = useState<Activity[]>([]);
@@ -46,6 +50,7 @@ const Index = () => {
   // Load documents on component mount
   useEffect(() => {
     loadDocuments();
+    loadStats();
   }, []);
 
   // Load activity log when user logs in or cabinet tab is opened
@@ -55,11 +60,13 @@ const Index = () => {
     }
   }, [user, token, activeTab]);
 
-  const loadDocuments = async (searchParams?: { search?: string; type?: string; status?: string }) => {
+  const loadDocuments = async (searchParams: DocumentQuery = {}) => {
     setIsLoadingDocuments(true);
     try {
-      const docs = await documents.getAll(searchParams);
-      setAllDocuments(docs);
+      const page = await documents.getPage(searchParams);
+      setAllDocuments(page.documents);
+      setNextCursor(page.next_cursor);
+      setDocumentsQuery(searchParams);
     } catch (error) {
       toast.error('Ошибка загрузки документов', {
         description: error instanceof Error ? error.message : 'Не удалось загрузить документы'
@@ -69,6 +76,35 @@ const Index = () => {
     }
   };
 
+  // Dashboard counters come from the server-side aggregates, not from the loaded page
+  const loadStats = async () => {
+    try {
+      setRegistryStats(await documents.getStats());
+    } catch (error) {
+      toast.error('Ошибка загрузки статистики', {
+        description: error instanceof Error ? error.message : 'Не удалось загрузить статистику'
+      });
+    }
+  };
+
+  // The listing is paginated: further pages continue from the last page's cursor
+  const loadMoreDocuments = async () => {
+    if (!nextCursor) return;
+    
+    setIsLoadingMore(true);
+    try {
+      const page = await documents.getPage({ ...documentsQuery, after: nextCursor });
+      setAllDocuments(current => [...current, ...page.documents]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      toast.error('Ошибка загрузки документов', {
+        description: error instanceof Error ? error.message : 'Не удалось загрузить документы'
+      });
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
   const loadActivityLog = async () => {
     if (!token) return;
     
@@ -175,7 +211,7 @@ const Index = () => {
       setRegNotes('');
 
       // Reload documents
-      await loadDocuments();
+      await Promise.all([loadDocuments(), loadStats()]);
     } catch (error) {
       toast.error('Ошибка регистрации', {
         description: error instanceof Error ? error.message : 'Не удалось зарегистрировать документ'
@@ -418,15 +454,15 @@ const Index = () => {
               <CardContent>
                 <div className="grid md:grid-cols-3 gap-6">
                   <div className="text-center">
-                    <div className="text-4xl font-bold text-primary">{allDocuments.length}</div>
+                    <div className="text-4xl font-bold text-primary">{registryStats?.total ?? '—'}</div>
                     <div className="text-muted-foreground mt-2">Документов в реестре</div>
                   </div>
                   <div className="text-center">
-                    <div className="text-4xl font-bold text-primary">{allDocuments.filter(d => d.status === 'Зарегистрирован').length}</div>
+                    <div className="text-4xl font-bold text-primary">{registryStats ? registryStats.by_status['Зарегистрирован'] ?? 0 : '—'}</div>
                     <div className="text-muted-foreground mt-2">Зарегистрировано</div>
                   </div>
                   <div className="text-center">
-                    <div className="text-4xl font-bold text-primary">{allDocuments.filter(d => d.status === 'В обработке').length}</div>
+                    <div className="text-4xl font-bold text-primary">{registryStats ? registryStats.by_status['В обработке'] ?? 0 : '—'}</div>
                     <div className="text-muted-foreground mt-2">В обработке</div>
                   </div>
                 </div>
@@ -489,6 +525,13 @@ const Index = () => {
                     </TableBody>
                   </Table>
                 )}
+                {!isLoadingDocuments && nextCursor && (
+                  <div className="text-center mt-4">
+                    <Button variant="outline" onClick={loadMoreDocuments} disabled={isLoadingMore}>
+                      {isLoadingMore ? 'Загрузка...' : 'Показать ещё'}
+                    </Button>
+                  </div>
+                )}
               </CardContent>
             </Card>
           </div>
@@ -522,7 +565,7 @@ const Index = () => {
               <CardHeader>
                 <CardTitle>Результаты поиска</CardTitle>
                 <CardDescription>
-                  {isLoadingDocuments ? 'Поиск...' : `Найдено документов: ${filteredDocuments.length}`}
+                  {isLoadingDocuments ? 'Поиск...' : `Найдено документов: ${filteredDocuments.length}${nextCursor ? '+' : ''}`}
                 </CardDescription>
               </CardHeader>
               <CardContent>
@@ -571,6 +614,13 @@ const Index = () => {
                     </TableBody>
                   </Table>
                 )}
+                {!isLoadingDocuments && nextCursor && (
+                  <div className="text-center mt-4">
+                    <Button variant="outline" onClick={loadMoreDocuments} disabled={isLoadingMore}>
+                      {isLoadingMore ? 'Загрузка...' : 'Показать ещё'}
+                    </Button>
+                  </div>
+                )}
               </CardContent>
             </Card>
           </div>